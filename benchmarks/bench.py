@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks for the heading generator.
+Generates a synthetic tree for every case, runs the case in a fresh interpreter so its peak memory use can be measured
+in isolation, and writes files/s, bytes/s and peak RSS of every case to a JSON file. A previous results file can be
+given to flag regressions.
+
+    python benchmarks/bench.py --files 5000 --output results.json
+    python benchmarks/bench.py --files 5000 --output new.json --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import treewalker
+from treegen import DEFAULT_SIZES, TreeSpec, generate_tree, parse_size, parse_sizes
+
+# Whether each case modifies the tree, in which case a fresh tree is generated for every run.
+CASES = {
+    'render': False,
+    'has_header': False,
+    'comment_file': True,
+    'comment_directory_recursive': True,
+    'comment_directory_flat': True,
+}
+# Relative change past which a difference with the compared results is reported as a regression.
+DEFAULT_THRESHOLD = 0.10
+HEADING = treewalker.Heading('Benchmark', 'MIT')
+
+
+def run_case(case, root) -> dict:
+    """
+    Run a benchmark case on a tree. Runs in the child interpreter.
+    :return: dict with the time taken and the amount of files and bytes processed.
+    """
+    generator = treewalker.HeadingGenerator(root, treewalker.AUTO_NAME)
+    paths = generator.find_source_files(recurse=True)
+    processed_bytes = None
+    if case == 'has_header':
+        # Only the start of each file is read; measured before the clock starts.
+        processed_bytes = sum(min(os.path.getsize(path), treewalker.HEADER_PROBE_SIZE) for path in paths)
+    start = time.perf_counter()
+    if case == 'render':
+        processed_bytes = sum(len(generator.render_heading(os.path.basename(path), HEADING)) for path in paths)
+    elif case == 'has_header':
+        for path in paths:
+            generator.has_header(path)
+    elif case == 'comment_file':
+        for path in paths:
+            treewalker.HeadingGenerator(path, treewalker.AUTO_NAME).comment_file(HEADING)
+    elif case == 'comment_directory_recursive':
+        generator.comment_directory(HEADING, recurse=True)
+    elif case == 'comment_directory_flat':
+        generator.comment_directory(HEADING, recurse=False)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'files': len(paths), 'bytes': processed_bytes}
+
+
+def measure(case, root) -> dict:
+    """
+    Run a case in a child interpreter.
+    :return: the child's measurements plus its peak RSS in bytes (None where the platform cannot tell).
+    """
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--child', case, root],
+                             stdout=subprocess.PIPE)
+    output = child.stdout.read()
+    child.stdout.close()
+    if hasattr(os, 'wait4'):
+        (_, status, usage) = os.wait4(child.pid, 0)
+        child.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is in KiB on Linux and in bytes on macOS.
+        peak_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    else:
+        child.wait()
+        peak_rss = None
+    if child.returncode:
+        raise RuntimeError('benchmark case {0} failed with status {1}'.format(case, child.returncode))
+    result = json.loads(output)
+    result['peak_rss'] = peak_rss
+    return result
+
+
+def benchmark(spec: TreeSpec, cases, repeat) -> dict:
+    """
+    Run every case `repeat` times and keep the fastest run of each.
+    :return: dict of results by case.
+    """
+    results = {}
+    for case in cases:
+        case_spec = TreeSpec(**spec.__dict__)
+        if case == 'comment_directory_flat':
+            case_spec.depth = 0
+        workdir = tempfile.mkdtemp(prefix='headergenerator-bench-')
+        try:
+            tree = None
+            best = None
+            for _ in range(repeat):
+                if tree is None or CASES[case]:
+                    shutil.rmtree(workdir)
+                    tree = generate_tree(workdir, case_spec)
+                run = measure(case, workdir)
+                if best is None or run['seconds'] < best['seconds']:
+                    best = run
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        processed_bytes = best['bytes'] if best['bytes'] is not None else tree['bytes']
+        seconds = max(best['seconds'], 1e-9)
+        results[case] = {
+            'seconds': best['seconds'],
+            'files': best['files'],
+            'bytes': processed_bytes,
+            'files_per_sec': best['files'] / seconds,
+            'bytes_per_sec': processed_bytes / seconds,
+            'peak_rss': best['peak_rss'],
+        }
+        print('{0:<30} {1:>10.0f} files/s {2:>10.1f} MiB/s {3:>8} MiB peak RSS'.format(
+            case, results[case]['files_per_sec'], results[case]['bytes_per_sec'] / 1024 ** 2,
+            '?' if best['peak_rss'] is None else best['peak_rss'] // 1024 ** 2), file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold) -> list:
+    """
+    Find the cases that got slower or use more memory than in a previous run.
+    :return: list of human-readable descriptions of the regressions.
+    """
+    regressions = []
+    for (case, result) in results.items():
+        previous = baseline.get('results', {}).get(case)
+        if not previous:
+            continue
+        if result['files_per_sec'] < previous['files_per_sec'] * (1 - threshold):
+            regressions.append('{0}: {1:.0f} files/s, was {2:.0f}'.format(
+                case, result['files_per_sec'], previous['files_per_sec']))
+        if result['peak_rss'] and previous.get('peak_rss') and result['peak_rss'] > previous['peak_rss'] * (1 + threshold):
+            regressions.append('{0}: {1} bytes peak RSS, was {2}'.format(case, result['peak_rss'], previous['peak_rss']))
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Benchmark the heading generator on synthetic project trees.')
+    parser.add_argument('--files', type=int, default=2000, help='amount of source files in the tree')
+    parser.add_argument('--depth', type=int, default=3, help='maximum nesting of directories')
+    parser.add_argument('--fanout', type=int, default=4, help='subdirectories per directory')
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+                        help="size distribution as weight:min-max buckets, e.g. '0.7:512-4K,0.3:4K-64K'")
+    parser.add_argument('--languages', default=','.join(TreeSpec().languages),
+                        help='comma-separated names of the languages of the files')
+    parser.add_argument('--headed-share', type=float, default=0.0, help='share of files already having a heading')
+    parser.add_argument('--large-files', type=int, default=0, help='amount of extra large files')
+    parser.add_argument('--large-size', type=parse_size, default='300M', help='size of each large file')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cases', default=','.join(CASES), help='comma-separated cases to run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case; the fastest is kept')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown or memory growth reported as a regression')
+    parser.add_argument('--child', nargs=2, metavar=('CASE', 'TREE'), help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.child:
+        json.dump(run_case(*args.child), sys.stdout)
+        return 0
+
+    spec = TreeSpec(args.files, args.depth, args.fanout, args.sizes, args.languages.split(','), args.headed_share,
+                    args.large_files, args.large_size, args.seed)
+    cases = [case for case in args.cases.split(',') if case]
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        print('unknown cases: ' + ', '.join(unknown), file=sys.stderr)
+        return 2
+
+    report = {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'tree': spec.to_dict(),
+        'repeat': args.repeat,
+        'results': benchmark(spec, cases, args.repeat),
+    }
+    if args.output:
+        with open(args.output, 'w') as fs:
+            json.dump(report, fs, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+    if args.compare:
+        with open(args.compare) as fs:
+            regressions = compare(report['results'], json.load(fs), args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Generates synthetic project trees for the benchmarks: a configurable amount of source files spread over nested
+directories, with a mix of languages and sizes and a share of files already carrying a heading.
+The same seed always generates the same tree.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import treewalker
+
+# Default size distribution: (weight, smallest size, largest size) in bytes.
+DEFAULT_SIZES = ((0.70, 512, 4 * 1024), (0.25, 4 * 1024, 64 * 1024), (0.05, 64 * 1024, 1024 * 1024))
+DEFAULT_LANGUAGES = (treewalker.CPP_NAME, treewalker.PYTHON_NAME, treewalker.JAVA_NAME, treewalker.JAVASCRIPT_NAME)
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+# Block written repeatedly to produce large files quickly.
+BLOCK_SIZE = 1024 * 1024
+
+
+def parse_size(text: str) -> int:
+    """
+    :param text: size in bytes, optionally followed by K, M or G.
+    :return: size in bytes.
+    """
+    text = text.strip().upper()
+    if text and text[-1] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def parse_sizes(text: str) -> tuple:
+    """
+    Parse a size distribution such as '0.7:512-4K,0.3:4K-64K'.
+    :return: tuple of (weight, smallest size, largest size).
+    """
+    buckets = []
+    for bucket in text.split(','):
+        weight, sizes = bucket.split(':')
+        smallest, largest = sizes.split('-')
+        buckets.append((float(weight), parse_size(smallest), parse_size(largest)))
+    return tuple(buckets)
+
+
+class TreeSpec:
+    def __init__(self, files=1000, depth=3, fanout=4, sizes=DEFAULT_SIZES, languages=DEFAULT_LANGUAGES,
+                 headed_share=0.0, large_files=0, large_size=300 * 1024 ** 2, seed=0):
+        """
+        :param files: amount of source files.
+        :param depth: maximum nesting of directories below the root.
+        :param fanout: amount of subdirectories per directory.
+        :param sizes: size distribution of the files, as (weight, smallest size, largest size) buckets.
+        :param languages: names of the languages of the files, picked evenly.
+        :param headed_share: share of the files (0 to 1) generated with a heading already.
+        :param large_files: amount of extra files of large_size bytes, to measure memory use on huge sources.
+        :param large_size: size in bytes of each of the large files.
+        :param seed: seed of the random generator.
+        """
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.sizes = tuple(sizes)
+        self.languages = tuple(languages)
+        self.headed_share = headed_share
+        self.large_files = large_files
+        self.large_size = large_size
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__, sizes=[list(bucket) for bucket in self.sizes], languages=list(self.languages))
+
+
+def write_body(fs, size, rng):
+    """
+    Write size bytes of code-looking text.
+    """
+    line = 'value_{0} = compute({0}, {1});\n'.format(rng.randrange(1000), rng.randrange(1000))
+    block = (line * (BLOCK_SIZE // len(line) + 1))[:min(size, BLOCK_SIZE)]
+    written = 0
+    while written < size:
+        chunk = block[:size - written]
+        fs.write(chunk)
+        written += len(chunk)
+
+
+def generate_tree(root, spec: TreeSpec) -> dict:
+    """
+    Generate a synthetic project tree.
+    :param root: directory to generate the tree in. It is created if needed.
+    :param spec: TreeSpec describing the tree.
+    :return: dict with the amount of files and bytes generated.
+    """
+    rng = random.Random(spec.seed)
+    languages = [treewalker.LANGUAGES_BY_NAME[name] for name in spec.languages]
+    heading = treewalker.Heading('Benchmark', 'MIT')
+    generator = treewalker.HeadingGenerator(root, treewalker.AUTO_NAME)
+    weights = [bucket[0] for bucket in spec.sizes]
+    total_bytes = 0
+
+    sizes = [None] * spec.files + [spec.large_size] * spec.large_files
+    for (index, size) in enumerate(sizes):
+        depth = rng.randint(0, spec.depth)
+        directory = os.path.join(root, *['d{0}'.format(rng.randrange(spec.fanout)) for _ in range(depth)])
+        os.makedirs(directory, exist_ok=True)
+        language = languages[index % len(languages)]
+        path = os.path.join(directory, 'file{0}.{1}'.format(index, language.extensions[0]))
+        if size is None:
+            (_, smallest, largest) = rng.choices(spec.sizes, weights)[0]
+            size = rng.randint(smallest, largest)
+        with open(path, 'w', newline='') as fs:
+            if rng.random() < spec.headed_share:
+                header = generator.render_heading(os.path.basename(path), heading, language=language)
+                fs.write(header)
+                total_bytes += len(header)
+            write_body(fs, size, rng)
+        total_bytes += size
+    return {'files': len(sizes), 'bytes': total_bytes}
@@ -0,0 +1,65 @@
+"""
+Lists the files of a git working tree that a change touches, by asking the local git repository: files changed or
+added since a commit, files staged in the index, and untracked files that are not ignored. Nothing is fetched, so
+the cost depends on the size of the change rather than on the size of the repository.
+"""
+
+import os
+import subprocess
+
+GIT_COMMAND = 'git'
+# Changes that leave a file in the working tree: added, copied, modified, renamed.
+DIFF_FILTER = '--diff-filter=ACMR'
+
+
+class GitError(Exception):
+    pass
+
+
+def run_git(directory, *args) -> bytes:
+    """
+    Run a git command in a directory of a working tree.
+    :param directory: directory to run the command in. Paths printed by the commands below are relative to it.
+    :param args: arguments of the git command.
+    :return: standard output of the command.
+    :raises GitError: if git is missing or the command fails, e.g. because directory is not in a working tree or
+    the ref does not exist.
+    """
+    try:
+        process = subprocess.run([GIT_COMMAND] + list(args), cwd=directory, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    except OSError as e:
+        raise GitError('could not run git: {0}'.format(e)) from e
+    if process.returncode:
+        raise GitError(os.fsdecode(process.stderr).strip() or 'git {0} failed'.format(args[0]))
+    return process.stdout
+
+
+def split_paths(output: bytes) -> list:
+    """
+    :param output: NUL-separated paths, as printed by git with -z.
+    :return: list of the paths, decoded as the file system does.
+    """
+    return [os.fsdecode(path) for path in output.split(b'\0') if path]
+
+
+def changed_paths(directory, since=None, staged=False, untracked=False) -> list:
+    """
+    List the files under a directory of a working tree touched by a change. Deleted files are left out.
+    :param directory: directory in a git working tree. Only the files under it are listed.
+    :param since: commit (or any ref) whose differences with the working tree are listed, e.g. 'origin/main'.
+    :param staged: list the files staged in the index.
+    :param untracked: list the untracked files, except those ignored by .gitignore and the like.
+    :return: list of paths (directory joined with the path of each file relative to it), each listed once, in the
+    order git lists them.
+    """
+    # Outside a working tree git diff would compare files instead, so make sure there is one.
+    run_git(directory, 'rev-parse', '--is-inside-work-tree')
+    relative = []
+    if since:
+        relative += split_paths(run_git(directory, 'diff', '--name-only', '-z', '--relative', DIFF_FILTER, since, '--'))
+    if staged:
+        relative += split_paths(run_git(directory, 'diff', '--cached', '--name-only', '-z', '--relative', DIFF_FILTER))
+    if untracked:
+        relative += split_paths(run_git(directory, 'ls-files', '--others', '--exclude-standard', '-z'))
+    return [os.path.join(directory, path) for path in dict.fromkeys(relative)]
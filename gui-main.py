@@ -6,20 +6,34 @@ Add header comments to the source code files of a project.
 Can be made recursive or not. Supports various languages (C++, Python).
 """
 
+import os
+import queue
+import threading
+import time
 import tkinter as tk
 import treewalker
-from tkinter import messagebox, scrolledtext
+from tkinter import messagebox, scrolledtext, ttk
 from tkinter.filedialog import askdirectory, askopenfilename
 
+# Interval between checks for progress of the signing worker, in milliseconds.
+POLL_INTERVAL = 100
+
 # Get program directory path, input language (can be set to auto so application figures it out
 # using file extensions) and recursive flag.
 
 class Application:
 
     def __init__(self, root: tk.Tk):
+        self.root = root
         self.dir_name = ''
         self.file_path = ''
 
+        # State of the directory signing running in the background.
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.started = 0.0
+        self.failures = []
+
         # Project Directory
         self.project_dir_label = tk.Label(root, text="Project directory:")
         self.project_dir_label.grid(row=0, column=0, sticky=tk.W, padx=10, pady=15)
@@ -49,7 +63,8 @@ class Application:
         self.selected_language = tk.StringVar(root)
         self.language_options = [treewalker.CPP_NAME, treewalker.PYTHON_NAME, treewalker.CSHARP_NAME,
                                  treewalker.JAVA_NAME, treewalker.LISP_NAME, treewalker.LUA_NAME,
-                                 treewalker.JAVASCRIPT_NAME, treewalker.VBNET_NAME, treewalker.BASH_NAME, treewalker.PERL_NAME]
+                                 treewalker.JAVASCRIPT_NAME, treewalker.VBNET_NAME, treewalker.BASH_NAME, treewalker.PERL_NAME,
+                                 treewalker.AUTO_NAME]
         self.selected_language.set(self.language_options[0])
         self.languages_optionmenu = tk.OptionMenu(root, self.selected_language, *self.language_options)
         self.languages_optionmenu.grid(row=2, column=1, sticky=tk.W)
@@ -78,6 +93,14 @@ class Application:
         self.file_remarks_textbox = scrolledtext.ScrolledText(root, height=10, width=20)
         self.file_remarks_textbox.grid(row=5, column=1, sticky=tk.W, pady=10)
 
+        # Progress of the directory signing
+        self.progress_bar = ttk.Progressbar(root, orient=tk.HORIZONTAL, mode='determinate', length=300)
+        self.progress_bar.grid(row=6, column=0, columnspan=2, sticky=tk.W, padx=10, pady=15)
+        self.progress_label = tk.Label(root, text='')
+        self.progress_label.grid(row=6, column=2, columnspan=2, sticky=tk.W)
+        self.cancel_btn = tk.Button(root, text='Cancel', command=self.cancel_signing, state=tk.DISABLED)
+        self.cancel_btn.grid(row=6, column=4, sticky=tk.W)
+
     def validate_heading_form(self) -> bool:
         # At the moment this just performs one check, but in the future we might want to add more elements that need validation.
         return self.author_entry.get() != None
@@ -117,14 +140,97 @@ class Application:
         if not heading:
             messagebox.showerror('Incorrect heading parameters', 'The heading parameters you entered are invalid.')
             return
+        if not os.path.isdir(self.dir_name):
+            messagebox.showerror('Incorrect path', 'You provided an invalid path to the project directory. You need to enter the full path to the directory.')
+            return
         generator = treewalker.HeadingGenerator(self.dir_name, self.selected_language.get())
+
+        # Sign in the background so the window stays responsive; the worker reports through progress_queue.
+        self.cancel_event.clear()
+        self.failures = []
+        self.started = time.monotonic()
+        self.progress_bar['value'] = 0
+        self.progress_label['text'] = 'Looking for source files...'
+        self.set_busy(True)
+        worker = threading.Thread(target=self.sign_directory, args=(generator, heading, self.recurse.get()), daemon=True)
+        worker.start()
+        self.root.after(POLL_INTERVAL, self.poll_progress)
+
+    def sign_directory(self, generator, heading, recurse):
+        """
+        Body of the background worker. Never touches the widgets, which may only be used from the main thread.
+        """
         try:
-            if not generator.comment_directory(heading, self.recurse.get()):
-                messagebox.showerror('Incorrect path', 'You provided an invalid path to the project directory. You need to enter the full path to the directory.')
-                return
+            generator.comment_directory(heading, recurse, progress=self.report_progress, cancel=self.cancel_event)
+            self.progress_queue.put(('done', None))
+        except treewalker.DirectorySigningError:
+            # The failures have already been reported file by file.
+            self.progress_queue.put(('done', None))
+        except Exception as e:
+            self.progress_queue.put(('done', e))
+
+    def report_progress(self, done, total, result):
+        self.progress_queue.put(('progress', (done, total, result)))
+
+    def poll_progress(self):
+        finished = False
+        error = None
+        progress = None
+        try:
+            while True:
+                (kind, value) = self.progress_queue.get_nowait()
+                if kind == 'progress':
+                    progress = value
+                    if value[2].status == treewalker.FAILED:
+                        self.failures.append(value[2])
+                else:
+                    finished = True
+                    error = value
+        except queue.Empty:
+            pass
+
+        if progress:
+            self.show_progress(*progress[:2])
+        if not finished:
+            self.root.after(POLL_INTERVAL, self.poll_progress)
+            return
+
+        self.set_busy(False)
+        if error:
+            messagebox.showerror('Signing unsuccessful', 'The project could not be successfully signed. Error details: ' + str(error))
+        elif self.failures:
+            self.show_failures()
+        elif self.cancel_event.is_set():
+            messagebox.showinfo('Signing cancelled', 'Signing was cancelled. The files processed so far keep their headings.')
+        else:
             messagebox.showinfo('Signing complete', 'The project or file was successfully signed.')
-        except:
-            messagebox.showerror('Signing unsuccessful', 'The project or file could not be successfully signed.')
+
+    def show_progress(self, done, total):
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate else 0.0
+        self.progress_bar['maximum'] = max(total, 1)
+        self.progress_bar['value'] = done
+        self.progress_label['text'] = '{0}/{1} files, {2:.0f} files/s, {3:.0f}s left'.format(done, total, rate, eta)
+
+    def show_failures(self):
+        window = tk.Toplevel(self.root)
+        window.wm_title('Signing incomplete')
+        tk.Label(window, text='The following files could not be signed:').pack(anchor=tk.W, padx=10, pady=5)
+        failures_text = scrolledtext.ScrolledText(window, height=15, width=80)
+        failures_text.insert(tk.END, '\n'.join('{0}: {1}'.format(f.path, f.error) for f in self.failures))
+        failures_text.configure(state=tk.DISABLED)
+        failures_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+    def set_busy(self, busy):
+        state = tk.DISABLED if busy else tk.NORMAL
+        self.comment_dir_btn['state'] = state
+        self.comment_file_btn['state'] = state
+        self.cancel_btn['state'] = tk.NORMAL if busy else tk.DISABLED
+
+    def cancel_signing(self):
+        self.cancel_event.set()
+        self.progress_label['text'] = 'Cancelling...'
 
     def set_file_name(self):
         self.select_file_entry.delete(0, tk.END)
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+
+"""
+Comments Boilerplate command-line interface.
+Run as `python -m headergenerator <command> ...`; see `python -m headergenerator --help` for the commands available.
+
+This runs from pre-commit hooks and build steps, often thousands of times a day, so it only imports what the command
+being run needs: modules used by a single command (json, sqlite3 through manifest...) are imported inside it.
+"""
+
+import argparse
+import os
+import sys
+
+import treewalker
+
+# Size of the blocks lists of paths are read from standard input in.
+READ_BLOCK_SIZE = 64 * 1024
+# Exit statuses.
+EXIT_OK = 0
+EXIT_PROBLEMS = 1
+EXIT_USAGE = 2
+
+
+def report_failures(failures):
+    for result in failures:
+        print('{0}\t{1}\t{2}'.format(result.status, result.path, result.error), file=sys.stderr)
+
+
+def read_paths(stream, separator=b'\0'):
+    """
+    Read a list of paths, such as the output of find -print0, without holding more than one block of it in memory.
+    :param stream: binary stream.
+    :param separator: byte separating the paths.
+    :return: generator of paths, decoded as the file system does.
+    """
+    remainder = b''
+    while True:
+        block = stream.read(READ_BLOCK_SIZE)
+        if not block:
+            break
+        paths = (remainder + block).split(separator)
+        remainder = paths.pop()
+        for path in paths:
+            if path:
+                yield os.fsdecode(path)
+    if remainder:
+        yield os.fsdecode(remainder)
+
+
+def start_run(args) -> tuple:
+    """
+    Set up the statistics and the journal of a run, recovering the journal if a previous run was interrupted.
+    :return: (RunStats, journal.Journal or None).
+    """
+    stats = treewalker.RunStats()
+    if args.profile:
+        import cProfile
+        stats.profiler = cProfile.Profile()
+    in_flight = None
+    if args.journal:
+        import journal
+        in_flight = journal.Journal(args.journal)
+        if not in_flight.is_empty():
+            (completed, removed) = in_flight.recover(args.rollback)
+            print('{0}: recovered an interrupted run, {1} file(s) completed, {2} rolled back'.format(
+                args.journal, completed, removed), file=sys.stderr)
+    return stats, in_flight
+
+
+def finish_run(args, stats, in_flight):
+    if in_flight:
+        in_flight.close()
+    if args.stats:
+        import json
+        json.dump(stats.to_dict(), sys.stderr, indent=1)
+        print(file=sys.stderr)
+    if args.profile:
+        stats.profiler.dump_stats(args.profile)
+
+
+def run_directory(args, method, *method_args) -> int:
+    """
+    Run a directory-wide HeadingGenerator method, reporting failures and the statistics of the run.
+    :param method: bound method such as HeadingGenerator.comment_directory, called with method_args and stats.
+    :return: EXIT_OK if every file was processed, EXIT_PROBLEMS otherwise.
+    """
+    (stats, in_flight) = start_run(args)
+    status = EXIT_OK
+    try:
+        method(*method_args, stats=stats, journal=in_flight)
+    except treewalker.DirectorySigningError as e:
+        report_failures(e.failures)
+        status = EXIT_PROBLEMS
+    finally:
+        finish_run(args, stats, in_flight)
+    return status
+
+
+def sign_listed(args, generator, heading) -> int:
+    """
+    Insert headings in the files listed on standard input, reporting each file as it is done.
+    :return: EXIT_OK if every file was signed, EXIT_PROBLEMS otherwise.
+    """
+    (stats, in_flight) = start_run(args)
+    separator = b'\0' if args.null else b'\n'
+    try:
+        for result in generator.comment_paths(read_paths(sys.stdin.buffer, separator), heading, args.jobs,
+                                              args.processes, stats, in_flight):
+            if result.status == treewalker.FAILED:
+                report_failures([result])
+            elif result.status != treewalker.ALREADY_HEADED:
+                print('{0}\t{1}'.format(result.status, result.path))
+    finally:
+        finish_run(args, stats, in_flight)
+    return EXIT_PROBLEMS if stats.files_failed else EXIT_OK
+
+
+def sign(args) -> int:
+    """
+    Insert headings in a source file or in the source files of a project directory.
+    :return: EXIT_OK if every file was signed, EXIT_PROBLEMS otherwise.
+    """
+    heading = treewalker.Heading(args.author, args.licence, args.description, args.remarks)
+    generator = treewalker.HeadingGenerator(args.path, args.language, args.durability)
+    if args.path == '-':
+        return sign_listed(args, generator, heading)
+    if not os.path.isdir(args.path):
+        try:
+            signed = generator.comment_file(heading)
+        except (OSError, ValueError) as e:
+            report_failures([treewalker.FileResult(args.path, treewalker.FAILED, e)])
+            return EXIT_PROBLEMS
+        if not signed:
+            print('{0}: not a source file or directory of the selected language'.format(args.path), file=sys.stderr)
+            return EXIT_USAGE
+        return EXIT_OK
+
+    if args.since or args.staged or args.untracked:
+        import gitfiles
+        try:
+            return run_directory(args, generator.comment_changes, heading, args.since, args.staged, args.untracked,
+                                 args.recurse, args.jobs, args.processes)
+        except gitfiles.GitError as e:
+            print('{0}: {1}'.format(args.path, e), file=sys.stderr)
+            return EXIT_USAGE
+
+    files = None
+    if args.manifest:
+        import manifest
+        files = manifest.Manifest(args.manifest, generator.manifest_fingerprint(heading))
+    try:
+        return run_directory(args, generator.comment_directory, heading, args.recurse, args.jobs, args.processes,
+                             args.ignore_file, files)
+    finally:
+        if files:
+            files.close()
+
+
+def refresh(args) -> int:
+    """
+    Re-render the existing headings of a source file or of the source files of a project directory.
+    :return: EXIT_OK if every heading could be refreshed, EXIT_PROBLEMS otherwise.
+    """
+    heading = treewalker.Heading(args.author, args.licence, args.description, args.remarks)
+    generator = treewalker.HeadingGenerator(args.path, args.language, args.durability)
+    if not os.path.isdir(args.path):
+        result = generator.refresh_file(heading)
+        if result is None:
+            print('{0}: not a source file or directory of the selected language'.format(args.path), file=sys.stderr)
+            return EXIT_USAGE
+        if result.status in (treewalker.FAILED, treewalker.MISSING, treewalker.MALFORMED):
+            report_failures([result])
+            return EXIT_PROBLEMS
+        return EXIT_OK
+    return run_directory(args, generator.refresh_directory, heading, args.recurse, args.jobs, args.processes,
+                         args.ignore_file)
+
+
+def strip(args) -> int:
+    """
+    Remove the headings of a source file or of the source files of a project directory.
+    :return: EXIT_OK if every heading found could be removed, EXIT_PROBLEMS otherwise.
+    """
+    generator = treewalker.HeadingGenerator(args.path, args.language, args.durability)
+    if not os.path.isdir(args.path):
+        result = generator.strip_file()
+        if result is None:
+            print('{0}: not a source file or directory of the selected language'.format(args.path), file=sys.stderr)
+            return EXIT_USAGE
+        if result.status in (treewalker.FAILED, treewalker.MALFORMED):
+            report_failures([result])
+            return EXIT_PROBLEMS
+        return EXIT_OK
+    return run_directory(args, generator.strip_directory, args.recurse, args.jobs, args.processes, args.ignore_file)
+
+
+def check(args) -> int:
+    """
+    Report the source files without a valid heading, without modifying anything.
+    :return: EXIT_OK if every file has a heading, EXIT_PROBLEMS otherwise.
+    """
+    generator = treewalker.HeadingGenerator(args.path, args.language)
+    if os.path.isdir(args.path):
+        results = generator.check_directory(args.recurse, args.jobs, args.processes, args.ignore_file)
+    else:
+        result = generator.check_file()
+        results = [result] if result else None
+    if results is None:
+        print('{0}: not a source file or directory of the selected language'.format(args.path), file=sys.stderr)
+        return EXIT_USAGE
+
+    problems = [result for result in results if result.status != treewalker.ALREADY_HEADED]
+    if args.json:
+        import json
+        json.dump([{'path': result.path, 'status': result.status, 'error': str(result.error) if result.error else None}
+                   for result in problems], sys.stdout, indent=1)
+        print()
+    else:
+        for result in problems:
+            print('{0}\t{1}'.format(result.status, result.path))
+    return EXIT_PROBLEMS if problems else EXIT_OK
+
+
+def watch(args) -> int:
+    """
+    Insert headings in the source files created in or moved into a project directory, until interrupted.
+    """
+    if not os.path.isdir(args.path):
+        print('{0}: not a directory'.format(args.path), file=sys.stderr)
+        return EXIT_USAGE
+    import watcher
+
+    def report(result):
+        if result.status == treewalker.FAILED:
+            report_failures([result])
+        elif result.status == treewalker.HEADED:
+            print('{0}\t{1}'.format(result.status, result.path), flush=True)
+
+    generator = treewalker.HeadingGenerator(args.path, args.language, args.durability)
+    backend = watcher.POLLING_BACKEND if args.poll else None
+    with watcher.Watcher(generator, treewalker.Heading(args.author, args.licence), args.recurse, args.ignore_file,
+                         args.settle, backend, args.poll_interval, report) as files:
+        try:
+            files.run()
+        except KeyboardInterrupt:
+            pass
+    return EXIT_OK
+
+
+def maintain_manifest(args) -> int:
+    """
+    Rebuild or compact a manifest of the files known to have a heading.
+    """
+    import manifest
+    with manifest.Manifest(args.manifest) as files:
+        if args.rebuild:
+            files.rebuild()
+            print('{0}: cleared, the next run will check every file again'.format(args.manifest))
+        else:
+            dropped = files.compact()
+            print('{0}: {1} entries dropped, {2} kept'.format(args.manifest, dropped, len(files)))
+    return EXIT_OK
+
+
+def add_selection_arguments(parser, verb):
+    """
+    Add the arguments selecting the files a command works on.
+    :param parser: subcommand parser.
+    :param verb: what the command does to the files, for the help messages.
+    """
+    parser.add_argument('path', help="source file or project directory; for sign, '-' to read a list of files from "
+                                     "standard input")
+    parser.add_argument('-l', '--language', required=True, choices=treewalker.LANGUAGE_NAMES + (treewalker.AUTO_NAME,),
+                        help='language of the source files, or Auto to detect it from each file extension')
+    parser.add_argument('-r', '--recurse', action='store_true', help=verb + ' subdirectories as well')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of files processed concurrently')
+    parser.add_argument('--processes', action='store_true', help='use worker processes instead of threads')
+    parser.add_argument('--ignore-file', action='append', default=[],
+                        help='.gitignore-style file listing more paths to skip; can be repeated')
+
+
+def add_heading_arguments(parser):
+    """
+    Add the arguments giving the contents of the headings.
+    """
+    parser.add_argument('-a', '--author', required=True, help='author of the files')
+    parser.add_argument('--licence', default='MIT', help='licence the files are distributed under (default: MIT)')
+    parser.add_argument('--description', default='', help='description of the file; ignored for directories')
+    parser.add_argument('--remarks', default='', help='remarks about the file; ignored for directories')
+
+
+def add_run_arguments(parser):
+    """
+    Add the arguments controlling how the files are written and reporting on the run.
+    """
+    parser.add_argument('--stats', action='store_true',
+                        help='print counters and time spent per phase as JSON on standard error')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='profile each phase with cProfile and save the profile to FILE (single worker only)')
+    parser.add_argument('--durability', choices=treewalker.DURABILITIES, default=treewalker.DURABILITY_NONE,
+                        help="'fsync' flushes every file to disk before moving on, 'group' flushes them in batches "
+                             "(default: none, leaving it to the system)")
+    parser.add_argument('--journal', metavar='FILE',
+                        help="with --durability group, journal of the files in flight; an interrupted run found in it "
+                             "is completed before starting")
+    parser.add_argument('--rollback', action='store_true',
+                        help='undo the files an interrupted run left in flight in the journal instead of completing them')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='headergenerator', description='A portable source file header generator.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    sign_parser = commands.add_parser('sign', help='insert headings in the source files that do not have one')
+    add_selection_arguments(sign_parser, 'sign')
+    add_heading_arguments(sign_parser)
+    add_run_arguments(sign_parser)
+    sign_parser.add_argument('--manifest', help='manifest file used to skip the files already known to have a heading')
+    sign_parser.add_argument('--since', metavar='REF',
+                             help='only sign the files changed or added since REF in the git repository, committed '
+                                  'or not, instead of walking the directory')
+    sign_parser.add_argument('--staged', action='store_true', help='only sign the files staged in the git index')
+    sign_parser.add_argument('--untracked', action='store_true',
+                             help='only sign the untracked files git does not ignore (can be combined with the above)')
+    sign_parser.add_argument('-0', '--null', action='store_true',
+                             help="with '-' as the path, the listed paths are separated by NUL characters, as printed "
+                                  "by find -print0, instead of new lines")
+    sign_parser.set_defaults(func=sign)
+
+    refresh_parser = commands.add_parser('refresh', help='re-render existing headings, e.g. to update the year')
+    add_selection_arguments(refresh_parser, 'refresh')
+    add_heading_arguments(refresh_parser)
+    add_run_arguments(refresh_parser)
+    refresh_parser.set_defaults(func=refresh)
+
+    strip_parser = commands.add_parser('strip', help='remove the headings inserted by sign')
+    add_selection_arguments(strip_parser, 'strip')
+    add_run_arguments(strip_parser)
+    strip_parser.set_defaults(func=strip)
+
+    check_parser = commands.add_parser('check', help='list the source files without a heading, changing nothing')
+    add_selection_arguments(check_parser, 'check')
+    check_parser.add_argument('--json', action='store_true', help='print the problems as a JSON list')
+    check_parser.set_defaults(func=check)
+
+    watch_parser = commands.add_parser('watch', help='sign the source files created in a directory as they appear')
+    watch_parser.add_argument('path', help='project directory')
+    watch_parser.add_argument('-l', '--language', required=True,
+                              choices=treewalker.LANGUAGE_NAMES + (treewalker.AUTO_NAME,),
+                              help='language of the source files, or Auto to detect it from each file extension')
+    watch_parser.add_argument('-r', '--recurse', action='store_true', help='watch subdirectories as well')
+    watch_parser.add_argument('--ignore-file', action='append', default=[], metavar='FILE',
+                              help='more .gitignore-style patterns of paths not to watch (can be repeated)')
+    watch_parser.add_argument('-a', '--author', required=True, help='author of the files')
+    watch_parser.add_argument('--licence', default='MIT', help='licence the files are distributed under (default: MIT)')
+    watch_parser.add_argument('--durability', choices=treewalker.DURABILITIES, default=treewalker.DURABILITY_NONE,
+                              help='how the files are flushed to disk, as for sign')
+    watch_parser.add_argument('--settle', type=float, default=1.0, metavar='SECONDS',
+                              help='time a file has to go without being written to before it is signed (default: 1)')
+    watch_parser.add_argument('--poll', action='store_true', help='poll the tree instead of using inotify')
+    watch_parser.add_argument('--poll-interval', type=float, default=2.0, metavar='SECONDS',
+                              help='time between two scans of the tree when polling (default: 2)')
+    watch_parser.set_defaults(func=watch)
+
+    manifest_parser = commands.add_parser('manifest', help='maintain the manifest of files known to have a heading')
+    manifest_parser.add_argument('manifest', help='path to the manifest file')
+    action = manifest_parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--rebuild', action='store_true', help='forget every file so the next run checks them again')
+    action.add_argument('--compact', action='store_true', help='drop files that changed or no longer exist')
+    manifest_parser.set_defaults(func=maintain_manifest)
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'journal', None) and args.durability != treewalker.DURABILITY_GROUP:
+        parser.error('--journal requires --durability group')
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
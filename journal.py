@@ -0,0 +1,134 @@
+"""
+Write-ahead journal of the files being rewritten by a run using group commit, so that a run that is killed can be
+completed or undone on the next start by looking at the files it lists, without scanning the tree again. Every
+temporary file is recorded, and the record flushed to disk, before the file is created.
+"""
+
+import json
+import os
+
+import treewalker
+
+# Kinds of records: a file about to be staged in a temporary file, and the list of the temporary files flushed to disk
+# and about to be renamed. Each record is a JSON list on its own line.
+STAGE_RECORD = 'stage'
+COMMIT_RECORD = 'commit'
+
+
+class Journal:
+    def __init__(self, path):
+        """
+        Open (or create) a journal. A journal that is not empty was left by an interrupted run and has to be
+        recovered before it is used again.
+        :param path: path to the journal file.
+        """
+        self.path = path
+        self.fs = open(path, 'a+', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def read(self) -> tuple:
+        """
+        :return: (files known to be durable, files that may not be), both as lists of (temporary file, file) pairs.
+        """
+        self.fs.seek(0)
+        staged = []
+        committed = set()
+        for line in self.fs:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A record cut short by the interruption.
+                continue
+            if record[0] == STAGE_RECORD:
+                staged.append((record[1], record[2]))
+            elif record[0] == COMMIT_RECORD:
+                committed.update(record[1])
+        durable = [entry for entry in staged if entry[0] in committed]
+        return durable, [entry for entry in staged if entry[0] not in committed]
+
+    def is_empty(self) -> bool:
+        self.fs.seek(0, os.SEEK_END)
+        return self.fs.tell() == 0
+
+    def stage(self, entries):
+        """
+        Record that files are about to be staged in temporary files, and flush the records to disk. This has to be
+        done before the temporary files are created, so that recovery can find every one of them.
+        :param entries: iterable of (temporary file, file) pairs.
+        """
+        self.fs.writelines(json.dumps([STAGE_RECORD, tmp_path, path]) + '\n' for (tmp_path, path) in entries)
+        self.sync()
+
+    def commit(self, tmp_paths):
+        """
+        Record that staged files have been flushed to disk and are about to be renamed.
+        :param tmp_paths: list of their temporary files.
+        """
+        self.fs.write(json.dumps([COMMIT_RECORD, tmp_paths]) + '\n')
+        self.sync()
+
+    def clear(self, in_flight=()):
+        """
+        Empty the journal once every file committed so far is renamed and flushed.
+        :param in_flight: (temporary file, file) pairs staged but not committed yet, which are recorded again.
+        """
+        in_flight = list(in_flight)
+        if not in_flight:
+            self.fs.seek(0)
+            self.fs.truncate()
+            self.sync()
+            return
+        # Rewritten aside and renamed into place, so that the records in flight are never lost.
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fs:
+            fs.writelines(json.dumps([STAGE_RECORD, tmp, path]) + '\n' for (tmp, path) in in_flight)
+            fs.flush()
+            os.fsync(fs.fileno())
+        self.fs.close()
+        os.replace(tmp_path, self.path)
+        self.fs = open(self.path, 'a+', encoding='utf-8')
+        treewalker.fsync_path(os.path.dirname(os.path.abspath(self.path)))
+
+    def sync(self):
+        self.fs.flush()
+        os.fsync(self.fs.fileno())
+
+    def recover(self, rollback=False) -> tuple:
+        """
+        Finish or undo the rewrites an interrupted run left in flight. Files whose new contents were flushed to disk
+        are renamed into place, unless rolling back; the temporary files of all the others, including those still
+        being written when the run stopped, are removed, leaving those files as they were before the run. Files
+        already renamed when the run stopped keep their new contents either way.
+        :param rollback: remove every temporary file instead of renaming the durable ones into place.
+        :return: (amount of files completed, amount of temporary files removed).
+        """
+        (durable, staged) = self.read()
+        if rollback:
+            (durable, staged) = ([], durable + staged)
+        completed = 0
+        directories = set()
+        for (tmp_path, path) in durable:
+            try:
+                os.replace(tmp_path, path)
+            except FileNotFoundError:
+                # Renamed before the interruption, or failed and removed.
+                continue
+            directories.add(os.path.dirname(path))
+            completed += 1
+        for directory in directories:
+            treewalker.fsync_path(directory)
+        removed = 0
+        for (tmp_path, _) in staged:
+            if os.path.exists(tmp_path):
+                treewalker.discard_file(tmp_path)
+                removed += 1
+        self.clear()
+        return completed, removed
+
+    def close(self):
+        self.fs.close()
@@ -0,0 +1,137 @@
+"""
+On-disk record of the source files already known to have a heading, so that repeated runs over a project skip the
+files that have not changed since without opening them.
+"""
+
+import os
+import sqlite3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL
+) WITHOUT ROWID;
+'''
+FINGERPRINT_KEY = 'fingerprint'
+
+
+def stat_key(st) -> tuple:
+    """
+    :param st: os.stat_result of a file.
+    :return: the part of the stat result that changes whenever the file is modified or replaced.
+    """
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def path_key(path) -> str:
+    """
+    :param path: path to a file, relative to the current directory or not.
+    :return: the absolute path the file is recorded under, so that a manifest works the same from any directory and
+    however the tree was spelled on the command line.
+    """
+    return os.path.abspath(path)
+
+
+class Manifest:
+    def __init__(self, path, fingerprint=None):
+        """
+        Open (or create) a manifest.
+        :param path: path to the manifest file.
+        :param fingerprint: summary of the parameters the headings are generated with. If it differs from the one
+        the manifest was written with, every entry is discarded since the files have to be checked again.
+        None opens the manifest whatever it was written with.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (FINGERPRINT_KEY,)).fetchone()
+        if fingerprint is not None and (row is None or row[0] != fingerprint):
+            with self.connection:
+                self.connection.execute('DELETE FROM files')
+                self.connection.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (FINGERPRINT_KEY, fingerprint))
+        # The whole manifest is kept in memory so looking files up costs no queries.
+        self.entries = {path: (size, mtime_ns, inode) for (path, size, mtime_ns, inode)
+                        in self.connection.execute('SELECT path, size, mtime_ns, inode FROM files')}
+        self.changed = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_unchanged(self, path, st) -> bool:
+        """
+        :param path: path to a source file.
+        :param st: os.stat_result of the file.
+        :return: whether the file was recorded as having a heading and has not been modified since.
+        """
+        return self.entries.get(path_key(path)) == stat_key(st)
+
+    def record(self, path, st):
+        """
+        Record that a file has a heading. Changes are kept in memory until save is called.
+        :param path: path to the source file.
+        :param st: os.stat_result of the file once it has the heading.
+        """
+        key = stat_key(st)
+        path = path_key(path)
+        self.entries[path] = key
+        self.changed[path] = key
+
+    def forget(self, path):
+        path = path_key(path)
+        self.entries.pop(path, None)
+        self.changed[path] = None
+
+    def save(self):
+        """
+        Write the changes recorded since the manifest was opened or last saved.
+        """
+        if not self.changed:
+            return
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                        [(path,) + key for (path, key) in self.changed.items() if key])
+            self.connection.executemany('DELETE FROM files WHERE path = ?',
+                                        [(path,) for (path, key) in self.changed.items() if not key])
+        self.changed = {}
+
+    def rebuild(self):
+        """
+        Discard every entry, so the next run checks every file again and records them afresh.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM files')
+        self.entries = {}
+        self.changed = {}
+        self.connection.execute('VACUUM')
+
+    def compact(self) -> int:
+        """
+        Drop the entries for files that no longer exist or have changed, and shrink the manifest file.
+        :return: number of entries dropped.
+        """
+        self.save()
+        stale = []
+        for (path, key) in self.entries.items():
+            try:
+                if stat_key(os.stat(path)) != key:
+                    stale.append(path)
+            except OSError:
+                stale.append(path)
+        for path in stale:
+            self.forget(path)
+        self.save()
+        self.connection.execute('VACUUM')
+        return len(stale)
+
+    def close(self):
+        self.save()
+        self.connection.close()
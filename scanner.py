@@ -0,0 +1,231 @@
+"""
+Walks a project directory tree looking for source files, skipping the directories and files that should never be
+signed: version control metadata, dependency and build directories, virtual environments and anything matched by
+.gitignore-style pattern files.
+"""
+
+import os
+import re
+
+# Directories never descended into, whatever the ignore files say.
+DEFAULT_IGNORED_DIRECTORIES = frozenset({
+    '.git', '.hg', '.svn', 'node_modules', 'bower_components', 'build', 'dist', '__pycache__', '.tox', '.nox',
+    'venv', '.venv', '.mypy_cache', '.pytest_cache', '.idea', '.vs'})
+# Pattern files read in every directory of the tree. Their rules apply to the directory they are in and below.
+DEFAULT_IGNORE_FILES = ('.gitignore', '.headerignore')
+# File whose presence marks a directory as a Python virtual environment, whatever it is called.
+VIRTUALENV_MARKER = 'pyvenv.cfg'
+
+
+def translate_pattern(pattern: str) -> str:
+    """
+    Translate a .gitignore glob into a regular expression matching paths relative to the directory of the file.
+    :param pattern: glob without leading/trailing slashes or negation.
+    :return: regular expression string.
+    """
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+            continue
+        if pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex += '/.*'
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+            continue
+        if c == '*':
+            regex += '[^/]*'
+        elif c == '?':
+            regex += '[^/]'
+        elif c == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                regex += re.escape(c)
+            else:
+                char_class = pattern[i + 1:end]
+                if char_class.startswith('!'):
+                    char_class = '^' + char_class[1:]
+                regex += '[' + char_class.replace('\\', '\\\\') + ']'
+                i = end
+        elif c == '\\' and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(c)
+        i += 1
+    return regex + r'\Z'
+
+
+class IgnoreRule:
+    __slots__ = ('base', 'regex', 'negated', 'directory_only', 'anchored')
+
+    def __init__(self, base: str, pattern: str):
+        """
+        A single line of a .gitignore-style file.
+        :param base: directory the pattern file is in, relative to the root of the scan ('' for the root itself).
+        :param pattern: the line, stripped of its newline.
+        """
+        self.base = base + '/' if base else ''
+        self.negated = pattern.startswith('!')
+        if self.negated:
+            pattern = pattern[1:]
+        self.directory_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # Patterns containing a slash are relative to the directory of the file, the rest match at any depth.
+        self.anchored = '/' in pattern
+        self.regex = re.compile(translate_pattern(pattern.lstrip('/')))
+
+    def matches(self, relpath: str, name: str, is_dir: bool) -> bool:
+        if self.directory_only and not is_dir:
+            return False
+        if not relpath.startswith(self.base):
+            return False
+        if self.anchored:
+            return self.regex.match(relpath, len(self.base)) is not None
+        return self.regex.match(name) is not None
+
+
+def read_ignore_file(path: str, base: str) -> list:
+    """
+    Parse a .gitignore-style file.
+    :param path: path to the file.
+    :param base: directory the rules apply to, relative to the root of the scan.
+    :return: list of IgnoreRule, in the order they appear in the file.
+    """
+    rules = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as fs:
+        for line in fs:
+            line = line.rstrip('\r\n')
+            # Trailing spaces are not significant unless escaped.
+            if not line.endswith('\\ '):
+                line = line.rstrip(' ')
+            if not line or line.startswith('#'):
+                continue
+            rules.append(IgnoreRule(base, line))
+    return rules
+
+
+def is_ignored(rules, relpath: str, name: str, is_dir: bool) -> bool:
+    # As in git, the last rule matching a path decides whether it is ignored.
+    for rule in reversed(rules):
+        if rule.matches(relpath, name, is_dir):
+            return not rule.negated
+    return False
+
+
+class TreeScanner:
+    def __init__(self, extensions, recurse=True, ignored_directories=DEFAULT_IGNORED_DIRECTORIES,
+                 ignore_files=DEFAULT_IGNORE_FILES, extra_ignore_files=()):
+        """
+        :param extensions: extensions of the files to find, without the leading dot.
+        :param recurse: whether to descend into subdirectories.
+        :param ignored_directories: names of directories never descended into.
+        :param ignore_files: names of the .gitignore-style files honoured in every directory of the tree.
+        :param extra_ignore_files: paths to more pattern files applying to the whole tree.
+        """
+        self.extensions = frozenset(extensions)
+        self.recurse = recurse
+        self.ignored_directories = frozenset(ignored_directories)
+        self.ignore_files = tuple(ignore_files)
+        self.extra_ignore_files = tuple(extra_ignore_files)
+        # Amount of directories listed and of entries seen in them by scan.
+        self.directories_scanned = 0
+        self.entries_scanned = 0
+
+    def is_source_file(self, name: str) -> bool:
+        # Hidden files are left alone, and so are files without an extension.
+        if name.startswith('.'):
+            return False
+        dot = name.rfind('.')
+        return dot > 0 and name[dot + 1:] in self.extensions
+
+    def scan(self, root: str):
+        """
+        Walk the tree under root, yielding source files as they are found so they can be processed while the
+        walk goes on. Files come out in a deterministic order: sorted by name within a directory, and each
+        directory before its subdirectories.
+        :param root: path to the directory to scan.
+        :return: generator of os.DirEntry for the source files. Their cached type information and stat results
+        can be reused to avoid touching the files again.
+        """
+        for (_, _, _, files) in self.walk(root):
+            yield from files
+
+    def walk(self, root: str, reldir='', rules=None):
+        """
+        Walk the tree under root directory by directory, in the same order as scan.
+        :param root: path to the directory to walk.
+        :param reldir: path of root relative to the root of the project, when walking part of it.
+        :param rules: ignore rules in force in root, by default those of the extra ignore files.
+        :return: generator of (directory path, path relative to the root of the project, list of the ignore rules in
+        force in the directory, list of os.DirEntry for its source files).
+        """
+        if rules is None:
+            rules = []
+            for path in self.extra_ignore_files:
+                rules.extend(read_ignore_file(path, ''))
+        # Stack of (directory path, path relative to root, rules in force).
+        pending = [(root, reldir, rules)]
+        while pending:
+            directory, reldir, rules = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                # Unreadable directories are skipped, like os.walk does.
+                continue
+            self.directories_scanned += 1
+            self.entries_scanned += len(entries)
+
+            names = {entry.name for entry in entries}
+            if reldir and VIRTUALENV_MARKER in names:
+                continue
+            local_rules = rules
+            for ignore_file in self.ignore_files:
+                if ignore_file in names:
+                    try:
+                        local_rules = local_rules + read_ignore_file(os.path.join(directory, ignore_file), reldir)
+                    except OSError:
+                        pass
+
+            subdirectories = []
+            files = []
+            for entry in entries:
+                relpath = reldir + '/' + entry.name if reldir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    if self.is_walked_directory(local_rules, relpath, entry.name):
+                        subdirectories.append((entry.path, relpath, local_rules))
+                elif self.is_selected_file(local_rules, relpath, entry.name):
+                    try:
+                        if entry.is_file():
+                            files.append(entry)
+                    except OSError:
+                        continue
+            yield directory, reldir, local_rules, files
+            # Pushed in reverse so they are popped in name order.
+            pending.extend(reversed(subdirectories))
+
+    def is_walked_directory(self, rules, relpath: str, name: str) -> bool:
+        """
+        :param rules: ignore rules in force in the parent directory.
+        :param relpath: path of the directory relative to the root of the project.
+        :param name: name of the directory.
+        :return: whether the walk descends into the directory.
+        """
+        return self.recurse and name not in self.ignored_directories and not is_ignored(rules, relpath, name, True)
+
+    def is_selected_file(self, rules, relpath: str, name: str) -> bool:
+        """
+        :return: whether a file is a source file that is not ignored. Arguments as for is_walked_directory.
+        """
+        return self.is_source_file(name) and not is_ignored(rules, relpath, name, False)
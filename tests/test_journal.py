@@ -0,0 +1,123 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE)
+
+import journal
+import treewalker
+
+FILES = 3000
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = journal.Journal(os.path.join(self.directory, 'journal'))
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.directory)
+
+    def make_file(self, name, contents):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as fs:
+            fs.write(contents)
+        return path
+
+    def test_recover_committed_and_staged(self):
+        path = self.make_file('a.py', 'old a')
+        other = self.make_file('b.py', 'old b')
+        self.journal.stage([(path + '.tmp', path), (other + '.tmp', other)])
+        self.make_file('a.py.tmp', 'new a')
+        self.make_file('b.py.tmp', 'new b')
+        self.journal.commit([path + '.tmp'])
+
+        self.assertEqual(self.journal.recover(), (1, 1))
+        with open(path) as fs:
+            self.assertEqual(fs.read(), 'new a')
+        with open(other) as fs:
+            self.assertEqual(fs.read(), 'old b')
+        self.assertEqual(sorted(os.listdir(self.directory)), ['a.py', 'b.py', 'journal'])
+        self.assertTrue(self.journal.is_empty())
+
+    def test_clear_keeps_files_in_flight(self):
+        path = self.make_file('a.py', 'old a')
+        self.journal.stage([(path + '.tmp', path)])
+        self.journal.commit([])
+        self.journal.clear([(path + '.tmp', path)])
+        self.assertEqual(self.journal.read(), ([], [(path + '.tmp', path)]))
+
+
+class KilledRunTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tree = os.path.join(self.directory, 'src')
+        self.journal_path = os.path.join(self.directory, 'journal')
+        os.mkdir(self.tree)
+        self.originals = {}
+        for i in range(FILES):
+            contents = ('x = {0}\n'.format(i) * 200).encode()
+            with open(os.path.join(self.tree, 'f{0}.py'.format(i)), 'wb') as fs:
+                fs.write(contents)
+            self.originals['f{0}.py'.format(i)] = contents
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def kill_run(self, *args):
+        """
+        Start signing the tree with group commit and kill the run, worker processes included, once it has staged
+        files.
+        """
+        process = subprocess.Popen([sys.executable, os.path.join(PACKAGE, 'headergenerator.py'), 'sign', self.tree,
+                                    '-l', 'Python', '-a', 'Author', '--durability', treewalker.DURABILITY_GROUP,
+                                    '--journal', self.journal_path] + list(args),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        deadline = time.monotonic() + 60
+        while process.poll() is None and time.monotonic() < deadline:
+            if any(name.endswith('.tmp') for name in os.listdir(self.tree)):
+                break
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+        if process.returncode != -signal.SIGKILL:
+            self.skipTest('the run finished before it could be killed')
+
+    def check_recovered(self, rollback):
+        with journal.Journal(self.journal_path) as in_flight:
+            in_flight.recover(rollback)
+            self.assertTrue(in_flight.is_empty())
+        names = os.listdir(self.tree)
+        self.assertEqual(sorted(names), sorted(self.originals))
+        headed = 0
+        for (name, contents) in self.originals.items():
+            with open(os.path.join(self.tree, name), 'rb') as fs:
+                data = fs.read()
+            if data != contents:
+                # Either untouched or fully signed, never in between.
+                self.assertTrue(data.endswith(b'\n' + contents), name)
+                self.assertIn(b'Author: Author', data)
+                headed += 1
+        return headed
+
+    def test_resume_with_threads(self):
+        self.kill_run('-j', '4')
+        self.check_recovered(False)
+
+    def test_resume_with_processes(self):
+        self.kill_run('-j', '4', '--processes')
+        self.check_recovered(False)
+
+    def test_rollback(self):
+        self.kill_run('-j', '4')
+        self.check_recovered(True)
+
+
+if __name__ == '__main__':
+    unittest.main()
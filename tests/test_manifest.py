@@ -0,0 +1,43 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manifest
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'module.py')
+        with open(self.path, 'w') as fs:
+            fs.write('x = 1\n')
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_paths_spelled_differently(self):
+        with manifest.Manifest('files.db') as files:
+            files.record('module.py', os.stat(self.path))
+            self.assertTrue(files.is_unchanged('./module.py', os.stat(self.path)))
+            self.assertTrue(files.is_unchanged(self.path, os.stat(self.path)))
+            self.assertEqual(len(files), 1)
+
+    def test_compact_from_another_directory(self):
+        with manifest.Manifest('files.db') as files:
+            files.record('module.py', os.stat(self.path))
+        os.mkdir('elsewhere')
+        os.chdir('elsewhere')
+        with manifest.Manifest('../files.db') as files:
+            self.assertEqual(files.compact(), 0)
+            self.assertEqual(len(files), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
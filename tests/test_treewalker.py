@@ -0,0 +1,84 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import treewalker
+
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'module.py')
+        self.generator = treewalker.HeadingGenerator(self.directory, 'Python')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_character_across_probe_boundary(self):
+        # A UTF-8 file longer than the probed prefix, with a two-byte character straddling its end.
+        with open(self.path, 'wb') as fs:
+            fs.write(b'x = 1\n')
+        self.generator.comment_path(self.path, treewalker.Heading('Zoë', 'MIT'))
+        with open(self.path, 'rb') as fs:
+            size = len(fs.read())
+        padding = treewalker.HEADER_PROBE_SIZE - 1 - size - len(b'# \n')
+        with open(self.path, 'ab') as fs:
+            fs.write(b'# ' + b'-' * padding + b'\n' + 'é\n'.encode() + b'y = 2\n' * 1000)
+        with open(self.path, 'rb') as fs:
+            data = fs.read()
+        self.assertEqual(data[treewalker.HEADER_PROBE_SIZE - 1:treewalker.HEADER_PROBE_SIZE + 1], 'é'.encode())
+
+        result = self.generator.refresh_path(self.path, treewalker.Heading('Zoë', 'Apache-2.0'))
+        self.assertEqual(result.status, treewalker.REFRESHED)
+        with open(self.path, 'rb') as fs:
+            text = fs.read().decode('utf-8')
+        self.assertIn('Author: Zoë', text)
+        self.assertIn('Licence: Apache-2.0', text)
+
+
+class NewlineRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'module.py')
+        self.generator = treewalker.HeadingGenerator(self.directory, 'Python')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def round_trip(self, newline):
+        original = newline.join([b'a = 1', b'b = 2', b''])
+        with open(self.path, 'wb') as fs:
+            fs.write(original)
+
+        self.assertEqual(self.generator.comment_path(self.path, treewalker.Heading('Author', 'MIT')).status,
+                         treewalker.HEADED)
+        self.assertEqual(self.generator.check_path(self.path).status, treewalker.ALREADY_HEADED)
+        result = self.generator.refresh_path(self.path, treewalker.Heading('Author', 'Apache-2.0'))
+        self.assertEqual(result.status, treewalker.REFRESHED)
+        with open(self.path, 'rb') as fs:
+            data = fs.read()
+        self.assertIn(b'Licence: Apache-2.0', data)
+        self.assertTrue(data.endswith(newline + original))
+        # Every line break of the file, heading included, is still the file's own.
+        self.assertEqual(data.replace(newline, b''), data.replace(b'\r', b'').replace(b'\n', b''))
+
+        self.assertEqual(self.generator.strip_path(self.path).status, treewalker.STRIPPED)
+        with open(self.path, 'rb') as fs:
+            self.assertEqual(fs.read(), original)
+
+    def test_lf(self):
+        self.round_trip(b'\n')
+
+    def test_crlf(self):
+        self.round_trip(b'\r\n')
+
+    def test_cr(self):
+        self.round_trip(b'\r')
+
+
+if __name__ == '__main__':
+    unittest.main()
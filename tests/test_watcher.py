@@ -0,0 +1,68 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import treewalker
+import watcher
+
+
+class WatcherTest(unittest.TestCase):
+    backend = watcher.POLLING_BACKEND
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.outside = tempfile.mkdtemp()
+        self.existing = self.write('old.py', 'x = 1\n')
+        generator = treewalker.HeadingGenerator(self.directory, 'Python')
+        self.results = []
+        self.watcher = watcher.Watcher(generator, treewalker.Heading('Author', 'MIT'), settle=0,
+                                       backend=self.backend, poll_interval=0, on_result=self.results.append)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.outside)
+
+    def write(self, name, text, mode='w', directory=None):
+        path = os.path.join(directory or self.directory, name)
+        with open(path, mode) as fs:
+            fs.write(text)
+        return path
+
+    def settle(self):
+        # Make sure modification times differ from those of the previous scan, then let every change settle.
+        time.sleep(0.05)
+        for _ in range(3):
+            self.watcher.poll(0.05)
+
+    def is_headed(self, path):
+        with open(path, 'rb') as fs:
+            return treewalker.HEADER_DISTINCTIVE.encode() in fs.readline()
+
+    def test_new_files_are_signed(self):
+        created = self.write('new.py', 'y = 2\n')
+        moved = self.write('moved.py', 'z = 3\n', directory=self.outside)
+        os.rename(moved, os.path.join(self.directory, 'moved.py'))
+        self.settle()
+        self.assertTrue(self.is_headed(created))
+        self.assertTrue(self.is_headed(os.path.join(self.directory, 'moved.py')))
+
+    def test_existing_files_are_left_alone(self):
+        self.write('old.py', 'more = 2\n', mode='a')
+        self.settle()
+        self.assertFalse(self.is_headed(self.existing))
+        self.assertEqual(self.results, [])
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available on Linux')
+class InotifyWatcherTest(WatcherTest):
+    backend = watcher.INOTIFY_BACKEND
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,10 +4,17 @@ Can be recursive.
 """
 
 import os
-import glob
-import re
-import datetime
+import codecs
+import errno
+import stat
+from functools import lru_cache
+from itertools import count
 from math import ceil
+from time import perf_counter
+from types import MappingProxyType
+
+# Modules only needed by some operations (datetime, tempfile, concurrent.futures, the scanner...) are imported where
+# they are used, which keeps the start-up of the command-line interface fast.
 
 START_KEY = 'start'
 FILLER_KEY = 'filler'
@@ -26,14 +33,14 @@ CSHARP_STYLE = {
     'filler' :'*',
     'end': '//'
 }
-CSHARP_EXTENSIONS = ('cs')
+CSHARP_EXTENSIONS = ('cs',)
 
 PYTHON_NAME = 'Python'
 PYTHON_STYLE = {
     'start': '"""',
     'filler': '"',
     'end': '"""'}
-PYTHON_EXTENSIONS = ('py')
+PYTHON_EXTENSIONS = ('py',)
 
 JAVA_NAME = 'Java'
 JAVA_STYLE = {
@@ -41,7 +48,7 @@ JAVA_STYLE = {
     'filler': '*',
     'end': '*/'
 }
-JAVA_EXTENSIONS = ('java')
+JAVA_EXTENSIONS = ('java',)
 
 LISP_NAME = 'Lisp'
 LISP_STYLE = {
@@ -57,7 +64,7 @@ LUA_STYLE = {
     FILLER_KEY: '-',
     END_KEY: '--]]'
 }
-LUA_EXTENSIONS = ('lua')
+LUA_EXTENSIONS = ('lua',)
 
 JAVASCRIPT_NAME = 'JavaScript'
 JAVASCRIPT_STYLE = {
@@ -65,7 +72,7 @@ JAVASCRIPT_STYLE = {
     FILLER_KEY: '*',
     END_KEY: '*/'
 }
-JAVASCRIPT_EXTENSIONS = ('js')
+JAVASCRIPT_EXTENSIONS = ('js',)
 
 VBNET_NAME = 'VB.NET'
 VBNET_STYLE = {
@@ -73,7 +80,7 @@ VBNET_STYLE = {
     FILLER_KEY: "'",
     END_KEY: "'"
 }
-VBNET_EXTENSIONS = ('vb')
+VBNET_EXTENSIONS = ('vb',)
 
 BASH_NAME = 'Bash'
 BASH_STYLE = {
@@ -81,7 +88,7 @@ BASH_STYLE = {
     FILLER_KEY: '#',
     END_KEY: '#'
 }
-BASH_EXTENSIONS = ('sh')
+BASH_EXTENSIONS = ('sh',)
 
 PERL_NAME = 'Perl'
 PERL_STYLE = {
@@ -89,16 +96,273 @@ PERL_STYLE = {
     FILLER_KEY: '#',
     END_KEY: '#'
 }
-PERL_EXTENSIONS = ('pl')
+PERL_EXTENSIONS = ('pl',)
+
+# Name to pass instead of a language to handle the source files of every supported language in one go.
+AUTO_NAME = 'Auto'
 
 HEADER_DISTINCTIVE = '@' * 3
+HEADING_WIDTH = 70
+# Amount of compiled heading templates kept around, enough for a run over a project mixing several languages.
+TEMPLATE_CACHE_SIZE = 32
+
+# Amount of bytes at the beginning of a file inspected to find out whether it has a heading.
+HEADER_PROBE_SIZE = 4096
+# Amount of files handed to a worker process at once.
+PROCESS_CHUNK_SIZE = 64
+# Largest heading block refreshing a heading can handle.
+MAX_HEADER_SIZE = 64 * 1024
+# Size of the blocks the body of a file is copied in when a heading is inserted.
+COPY_CHUNK_SIZE = 1024 * 1024
+# Byte order mark of UTF-8 files, kept in front of the heading when a file starts with it.
+UTF8_BOM = codecs.BOM_UTF8
+# Byte order marks of encodings whose newlines and comment markers are not ASCII bytes, which are refused rather than
+# corrupted. The UTF-32 ones come first since the UTF-16 little-endian mark is a prefix of the UTF-32 one.
+UNSUPPORTED_BOMS = ((codecs.BOM_UTF32_LE, 'UTF-32'), (codecs.BOM_UTF32_BE, 'UTF-32'),
+                    (codecs.BOM_UTF16_LE, 'UTF-16'), (codecs.BOM_UTF16_BE, 'UTF-16'))
+# Encoding assumed for files that are not valid UTF-8. Every byte sequence is valid Latin-1.
+LEGACY_ENCODING = 'latin-1'
+# Durability of the files rewritten by a run: left for the system to flush (an atomic rename still guarantees a file is
+# never seen half-written), flushed to disk one by one, or flushed and renamed in batches of GROUP_COMMIT_SIZE files.
+DURABILITY_NONE = 'none'
+DURABILITY_FSYNC = 'fsync'
+DURABILITY_GROUP = 'group'
+DURABILITIES = (DURABILITY_NONE, DURABILITY_FSYNC, DURABILITY_GROUP)
+GROUP_COMMIT_SIZE = 256
+# Errors meaning a kernel-side copy is not supported for this pair of files, rather than an I/O failure.
+_COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+
+def current_year() -> int:
+    import datetime
+    return datetime.date.today().year
+
+
+def _copy_file_range(src_fd, dst_fd, count) -> int:
+    return os.copy_file_range(src_fd, dst_fd, count)
+
+
+def _sendfile(src_fd, dst_fd, count) -> int:
+    return os.sendfile(dst_fd, src_fd, None, count)
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def copy_fd(src_fd, dst_fd) -> int:
+    """
+    Copy everything from the current position of src_fd to the current position of dst_fd in fixed-size chunks.
+    Kernel-side copies are used where the platform provides them, so the data never has to enter user space.
+    :return: number of bytes copied.
+    """
+    copied = 0
+    kernel_copies = [copy for (copy, name) in ((_copy_file_range, 'copy_file_range'), (_sendfile, 'sendfile'))
+                     if hasattr(os, name)]
+    for copy in kernel_copies:
+        try:
+            while True:
+                amount = copy(src_fd, dst_fd, COPY_CHUNK_SIZE)
+                if not amount:
+                    return copied
+                copied += amount
+        except OSError as e:
+            # Only fall back if nothing was copied yet, otherwise the destination would be left inconsistent.
+            if copied or e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+    while True:
+        chunk = os.read(src_fd, COPY_CHUNK_SIZE)
+        if not chunk:
+            return copied
+        _write_all(dst_fd, chunk)
+        copied += len(chunk)
+
+
+def fsync_path(path):
+    """
+    Flush a file, or the entries of a directory, to disk.
+    Does nothing for directories where the platform cannot open them (Windows), as renames are durable there anyway.
+    """
+    if os.name == 'nt' and os.path.isdir(path):
+        return
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def stage_splice(path, header: bytes, skip=0, sync=False, tmp_path=None) -> tuple:
+    """
+    Write what splice_file would replace a file with to a temporary file in the same directory, with the permissions
+    and ownership of the original, leaving the original untouched.
+    :param path: path to the file to rewrite. Symbolic links are followed so the link itself is preserved.
+    :param header: bytes to write at the beginning of the file.
+    :param skip: amount of bytes at the beginning of the original file to drop.
+    :param sync: flush the temporary file to disk before returning.
+    :param tmp_path: path to the temporary file, in the directory of the real path, e.g. as recorded in a journal
+    beforehand. It must not exist. By default a new one is picked.
+    :return: (path to the temporary file, real path to the file, size of the rewritten file). Renaming the temporary
+    file over the real path completes the rewrite; removing it cancels it.
+    """
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    if tmp_path:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o600)
+    else:
+        import tempfile
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=directory)
+    try:
+        try:
+            src_fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                st = os.fstat(src_fd)
+                _write_all(fd, header)
+                os.lseek(src_fd, skip, os.SEEK_SET)
+                size = len(header) + copy_fd(src_fd, fd)
+            finally:
+                os.close(src_fd)
+            if sync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+        if hasattr(os, 'chown'):
+            try:
+                os.chown(tmp_path, st.st_uid, st.st_gid)
+            except PermissionError:
+                pass
+    except BaseException:
+        discard_file(tmp_path)
+        raise
+    return tmp_path, path, size
+
+
+def discard_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def splice_file(path, header: bytes, skip=0, sync=False) -> int:
+    """
+    Replace the first `skip` bytes of a file with `header`, streaming the rest of the file through a temporary
+    file in the same directory which is then atomically renamed over the original.
+    Memory usage is independent of the size of the file and a crash never leaves the file half-written.
+    The permissions and ownership of the original file are kept; its modification time is that of the rewrite,
+    as with any other edit.
+    :param path: path to the file to rewrite. Symbolic links are followed so the link itself is preserved.
+    :param header: bytes to write at the beginning of the file.
+    :param skip: amount of bytes at the beginning of the original file to drop.
+    :param sync: flush the new contents and the rename to disk before returning.
+    :return: size of the rewritten file.
+    """
+    (tmp_path, path, size) = stage_splice(path, header, skip, sync)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard_file(tmp_path)
+        raise
+    if sync:
+        fsync_path(os.path.dirname(path))
+    return size
+
+class FileFormat:
+    __slots__ = ('encoding', 'bom', 'newline')
+
+    def __init__(self, encoding='utf-8', bom=b'', newline=os.linesep):
+        """
+        How the text of a file is stored, which the heading inserted in it has to match.
+        :param encoding: name of the codec of the file.
+        :param bom: byte order mark the file starts with, b'' if none.
+        :param newline: dominant line separator of the file.
+        """
+        self.encoding = encoding
+        self.bom = bom
+        self.newline = newline
+
+    def encode(self, text) -> bytes:
+        return text.encode(self.encoding)
+
+    def decode(self, data) -> str:
+        return data.decode(self.encoding)
+
+    def __repr__(self):
+        return 'FileFormat({0!r}, {1!r}, {2!r})'.format(self.encoding, self.bom, self.newline)
+
+
+def sniff_format(prefix: bytes, complete=None) -> FileFormat:
+    """
+    Work out the encoding, byte order mark and newline style of a file from its first bytes, without decoding more
+    than the prefix.
+    :param prefix: first bytes of the file, as returned by HeadingGenerator.read_prefix.
+    :param complete: whether prefix is the whole file. By default, whether it is shorter than HEADER_PROBE_SIZE.
+    :return: FileFormat. Files without line breaks get os.linesep.
+    """
+    for (bom, name) in UNSUPPORTED_BOMS:
+        if prefix.startswith(bom):
+            raise ValueError('{0} encoded files are not supported'.format(name))
+    bom = UTF8_BOM if prefix.startswith(UTF8_BOM) else b''
+    if complete is None:
+        complete = len(prefix) < HEADER_PROBE_SIZE
+    # The prefix may end in the middle of a multi-byte character, which the incremental decoder tolerates.
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=complete)
+        encoding = 'utf-8'
+    except UnicodeDecodeError:
+        encoding = LEGACY_ENCODING
+
+    crlf = prefix.count(b'\r\n')
+    counts = ((prefix.count(b'\n') - crlf, '\n'), (crlf, '\r\n'), (prefix.count(b'\r') - crlf, '\r'))
+    (amount, newline) = max(counts, key=lambda c: c[0])
+    return FileFormat(encoding, bom, newline if amount else os.linesep)
+
+# Phases of a run, as reported by RunStats.
+WALK_PHASE = 'walk'
+PROBE_PHASE = 'probe'
+RENDER_PHASE = 'render'
+WRITE_PHASE = 'write'
+PHASES = (WALK_PHASE, PROBE_PHASE, RENDER_PHASE, WRITE_PHASE)
+
+HEADED = 'headed'
+REFRESHED = 'refreshed'
+STRIPPED = 'stripped'
+# Not a source file of the selected language, when given a list of paths.
+SKIPPED = 'skipped'
+ALREADY_HEADED = 'already-headed'
+MISSING = 'missing'
+MALFORMED = 'malformed'
+FAILED = 'error'
 
 class Language:
+    __slots__ = ('name', 'extensions', 'style')
+
     def __init__(self, name, extensions, style):
         self.name = name
         self.extensions = extensions
         self.style = style
 
+# Every supported language, created once. Look them up through the indexes below rather than building new ones.
+LANGUAGES = (
+    Language(CPP_NAME, CPP_EXTENSIONS, CPP_STYLE),
+    Language(PYTHON_NAME, PYTHON_EXTENSIONS, PYTHON_STYLE),
+    Language(CSHARP_NAME, CSHARP_EXTENSIONS, CSHARP_STYLE),
+    Language(JAVA_NAME, JAVA_EXTENSIONS, JAVA_STYLE),
+    Language(LISP_NAME, LISP_EXTENSIONS, LISP_STYLE),
+    Language(LUA_NAME, LUA_EXTENSIONS, LUA_STYLE),
+    Language(JAVASCRIPT_NAME, JAVASCRIPT_EXTENSIONS, JAVASCRIPT_STYLE),
+    Language(VBNET_NAME, VBNET_EXTENSIONS, VBNET_STYLE),
+    Language(BASH_NAME, BASH_EXTENSIONS, BASH_STYLE),
+    Language(PERL_NAME, PERL_EXTENSIONS, PERL_STYLE)
+)
+LANGUAGE_NAMES = tuple(language.name for language in LANGUAGES)
+LANGUAGES_BY_NAME = MappingProxyType({language.name: language for language in LANGUAGES})
+LANGUAGES_BY_EXTENSION = MappingProxyType({extension: language for language in LANGUAGES
+                                           for extension in language.extensions})
+
 class Heading:
     def __init__(self, author, licence, description='', remarks=''):
         self.author = author
@@ -106,97 +370,62 @@ class Heading:
         self.description = description
         self.remarks = remarks
 
-class HeadingGenerator:
-    def __init__(self, path: str, language_str: str):
+class HeadingTemplate:
+    def __init__(self, style, heading, width=HEADING_WIDTH, year=None, newline=os.linesep):
         """
-        :param path: path to root of directory to walk through
+        Heading block with everything but the file name rendered in advance, so that signing many files with the
+        same heading only costs the rendering of one line per file.
+        :param style: comment style of the language, i.e. one of the *_STYLE dicts.
+        :param heading:
+        :param width: width of the block in columns.
+        :param year: copyright year, the current one by default.
+        :param newline: line separator of the block, which should be that of the file it goes into.
         """
-        self.path = path
-        self.language = self.get_language(language_str)
+        self.style = style
+        self.width = width
+        self.year = year if year else current_year()
+        self.newline = newline
 
-    def get_language(self, language_string: str) -> Language:
-        """
-        Get language object based on its string representation.
-        :param language_string:
-        :return: Language object.
-        """
+        distinctive = self.style['start'] + HEADER_DISTINCTIVE + self.style['filler'] \
+                                                                 * (self.get_filling_amount(HEADER_DISTINCTIVE, width) - 1) + self.style['end']
+        empty_line = self.get_filling_line(width, ' ')
+        author_line = self.get_block_line('Author: ' + heading.author, width)
+        copyright_line = self.get_block_line('Copyright (C) ' + str(self.year), width)
+        licence_line = self.get_block_line('Licence: ' + heading.licence, width)
+        description_block = self.get_block(heading.description, width)
+        remarks_block = self.get_block('Remarks: ' + heading.remarks if heading.remarks else '', width)
+        filled_line = self.get_filling_line(width)
 
-        # Switch statement.
-        return {
-            CPP_NAME: Language(CPP_NAME, CPP_EXTENSIONS, CPP_STYLE),
-            PYTHON_NAME: Language(PYTHON_NAME, PYTHON_EXTENSIONS, PYTHON_STYLE),
-            CSHARP_NAME: Language(CSHARP_NAME, CSHARP_EXTENSIONS, CSHARP_STYLE),
-            JAVA_NAME: Language(JAVA_NAME, JAVA_EXTENSIONS, JAVA_STYLE),
-            LISP_NAME: Language(LISP_NAME, LISP_EXTENSIONS, LISP_STYLE),
-            LUA_NAME: Language(LUA_NAME, LUA_EXTENSIONS, LUA_STYLE),
-            JAVASCRIPT_NAME: Language(JAVASCRIPT_NAME, JAVASCRIPT_EXTENSIONS, JAVA_STYLE),
-            VBNET_NAME: Language(VBNET_NAME, VBNET_EXTENSIONS, VBNET_STYLE),
-            BASH_NAME: Language(BASH_NAME, BASH_EXTENSIONS, BASH_STYLE),
-            PERL_NAME: Language(PERL_NAME, PERL_EXTENSIONS, PERL_STYLE)
-        }.get(language_string, None)
-
-    # TODO -- Complete method.
-    """
-    def detect_source_language(self, filename : str) -> Language:
-        # Extract file extension to identify the language of the source file.
-        extension = os.path.splitext(filename)[1][1:]
-        language_exts = []
-        self.language.extensions.count(extension) > 0
-        # Switch statement.
-        return {
-            CPP_EXTENSIONS: Language(CPP_NAME, CPP_EXTENSIONS, CPP_STYLE),
-            PYTHON_NAME: Language(PYTHON_NAME, PYTHON_EXTENSIONS, PYTHON_STYLE),
-            CSHARP_NAME: Language(CSHARP_NAME, CSHARP_EXTENSIONS, CSHARP_STYLE),
-            JAVA_NAME: Language(JAVA_NAME, JAVA_EXTENSIONS, JAVA_STYLE),
-            LISP_NAME: Language(LISP_NAME, LISP_EXTENSIONS, LISP_STYLE),
-            LUA_NAME: Language(LUA_NAME, LUA_EXTENSIONS, LUA_STYLE),
-            JAVASCRIPT_NAME: Language(JAVASCRIPT_NAME, JAVASCRIPT_EXTENSIONS, JAVA_STYLE),
-            VBNET_NAME: Language(VBNET_NAME, VBNET_EXTENSIONS, VBNET_STYLE),
-            BASH_NAME: Language(BASH_NAME, BASH_EXTENSIONS, BASH_STYLE)
-        }.get(filename, None)
-    """
+        # First and last lines of the block, which identify it in a file.
+        self.distinctive = distinctive
+        self.empty_line = empty_line
+        self.filled_line = filled_line
 
-    def prepend_text(self, file, blocks):
-        """
-        :param file: open stream to file to edit
-        :return: nothing
-        """
-        file_contents = file.read()
-        file.seek(0, 0)
-        file.write(blocks + file_contents)
+        # The block is made of the prefix, the file name line, an empty line, the description and remarks lines
+        # (details) and the closing lines.
+        self.prefix = newline.join([distinctive, empty_line]) + newline
+        self.details = newline.join([block for block in (description_block, remarks_block) if block])
+        self.closing = newline.join([empty_line, author_line, copyright_line, licence_line, filled_line]) + newline * 2
 
-    def insert_heading(self, file, heading):
+    def render(self, filename, details=None) -> str:
         """
-        Inserts a string of text at the beginning of a file formatted as a constant-width block.
-        :param file:
-        :param heading:
-        :return:
+        :param filename: name of the file the heading is for.
+        :param details: description and remarks lines to use instead of the heading's, e.g. those of an existing block.
+        :return: the complete heading block.
         """
-        max_columns = 70
-        distinctive = self.language.style['start'] + HEADER_DISTINCTIVE + self.language.style['filler'] \
-                                                                          * (self.get_filling_amount(HEADER_DISTINCTIVE, max_columns) - 1) + self.language.style['end']
-        empty_line = self.get_filling_line(max_columns, ' ')
-        filename_line = self.get_block_line(os.path.split(file.name)[1], max_columns, align='centre')
-        author_line = self.get_block_line('Author: ' + heading.author, max_columns)
-        copyright_line = self.get_block_line('Copyright (C) ' + str(datetime.datetime.now().year), max_columns)
-        licence_line = self.get_block_line('Licence: ' + heading.licence, max_columns)
-        description_block = self.get_block(heading.description, max_columns)
-        remarks_block = self.get_block('Remarks: ' + heading.remarks if heading.remarks else '', max_columns)
-        filled_line = self.get_filling_line(max_columns)
-
-        lines =\
-            [distinctive, empty_line, filename_line, empty_line, description_block, remarks_block, empty_line, author_line, copyright_line, licence_line, filled_line]
-        block = os.linesep.join([line for line in lines if line]) + os.linesep * 2
-        self.prepend_text(file, block)
+        filename_line = self.get_block_line(filename, self.width, align='centre')
+        details = self.details if details is None else details
+        return self.prefix + (filename_line + self.newline if filename_line else '') + self.empty_line + self.newline + \
+            (details + self.newline if details else '') + self.closing
 
     def get_filling_line(self, width, filler='') -> str:
-        filling = filler if filler else self.language.style['filler']
-        return self.get_block_line(filling * ceil(width - (len(self.language.style['start']) + len(self.language.style['end']) + 2) / len(filling)), width)
+        filling = filler if filler else self.style['filler']
+        return self.get_block_line(filling * ceil(width - (len(self.style['start']) + len(self.style['end']) + 2) / len(filling)), width)
 
     def get_block(self, text, width, align='left') -> str:
         lines = self.split_string(text, width)
-        line_separator = ' ' + self.language.style['end'] + os.linesep + self.language.style['start'] + ' '
-        return os.linesep.join([self.get_block_line(ln, width, align) for ln in lines])
+        line_separator = ' ' + self.style['end'] + self.newline + self.style['start'] + ' '
+        return self.newline.join([self.get_block_line(ln, width, align) for ln in lines])
 
     def get_block_line(self, text, width, align='left') -> str:
         """
@@ -211,15 +440,15 @@ class HeadingGenerator:
         line = ''
         filling_amount = self.get_filling_amount(text, width)
         if align == 'left':
-            line = self.language.style['start'] + ' {0} '.format(text) + ' ' * filling_amount + self.language.style['end']
+            line = self.style['start'] + ' {0} '.format(text) + ' ' * filling_amount + self.style['end']
         elif align == 'right':
-            line = self.language.style['start'] + ' ' * filling_amount + ' {0} '.format(text) + self.language.style['end']
+            line = self.style['start'] + ' ' * filling_amount + ' {0} '.format(text) + self.style['end']
         elif align == 'centre':
-            line = self.language.style['start'] + ' ' * ceil((filling_amount / 2)) + ' {0} '.format(text) + ' ' * ceil((filling_amount / 2)) + self.language.style['end']
+            line = self.style['start'] + ' ' * ceil((filling_amount / 2)) + ' {0} '.format(text) + ' ' * ceil((filling_amount / 2)) + self.style['end']
         return self.adjust_line_width(line, width)
 
     def split_string(self, text, width) -> list:
-        max_txt_size_per_line = width - (len(self.language.style['start']) + len(self.language.style['end']) + 2)
+        max_txt_size_per_line = width - (len(self.style['start']) + len(self.style['end']) + 2)
 
         if len(text) > max_txt_size_per_line:
             # Split text string into multiple list elements and then join them in terms of filler and os.separator.
@@ -244,10 +473,10 @@ class HeadingGenerator:
         line_list = list(line)
         if len(line_list) < width:
             # Insert padding characters until the width of the line is consistent with the rest of the block.
-            line_list.insert(-(len(self.language.style['end'])), ' ' * (width - len(line_list)))
+            line_list.insert(-(len(self.style['end'])), ' ' * (width - len(line_list)))
         elif len(line_list) > width:
             # Locate the slice containing the extra characters and remove them from the line.
-            extrapadding_end = len(line_list) - ((len(line_list) - width) + len(self.language.style['end']) + 1)
+            extrapadding_end = len(line_list) - ((len(line_list) - width) + len(self.style['end']) + 1)
             extrapadding_start = extrapadding_end - (len(line_list) - width)
             line_list[extrapadding_start:extrapadding_end + 1] = []
         return ''.join(line_list)
@@ -258,66 +487,1144 @@ class HeadingGenerator:
         :param text:
         :return:
         """
-        startlen = len(self.language.style['start'])
-        fillinglen = len(self.language.style['filler'])
-        endlen = len(self.language.style['end'])
+        startlen = len(self.style['start'])
+        fillinglen = len(self.style['filler'])
+        endlen = len(self.style['end'])
         amount = abs(ceil((width - (startlen + endlen + len(text))) / fillinglen))
         return amount if amount < width else ceil((width - (startlen + endlen)) / fillinglen)
 
-    def has_header(self, filestream) -> bool:
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _compile_template(start, filler, end, author, licence, description, remarks, width, year, newline) -> HeadingTemplate:
+    style = {START_KEY: start, FILLER_KEY: filler, END_KEY: end}
+    return HeadingTemplate(style, Heading(author, licence, description, remarks), width, year, newline)
+
+
+def get_heading_template(style, heading, width=HEADING_WIDTH, year=None, newline=os.linesep) -> HeadingTemplate:
+    """
+    Get the compiled template for a style and heading, compiling it only the first time it is requested.
+    :param style: comment style of the language, i.e. one of the *_STYLE dicts.
+    :param heading:
+    :param width: width of the block in columns.
+    :param year: copyright year, the current one by default.
+    :param newline: line separator of the block.
+    :return: HeadingTemplate
+    """
+    if not year:
+        year = current_year()
+    return _compile_template(style[START_KEY], style[FILLER_KEY], style[END_KEY], heading.author, heading.licence,
+                             heading.description, heading.remarks, width, year, newline)
+
+
+@lru_cache(maxsize=None)
+def _compile_markers(start, filler, end) -> tuple:
+    # The marker lines do not depend on the year; passing one spares looking up the date.
+    template = HeadingTemplate({START_KEY: start, FILLER_KEY: filler, END_KEY: end}, Heading('', ''), year=1)
+    return template.distinctive.encode(), template.empty_line.encode(), template.filled_line.encode()
+
+
+def get_heading_markers(style) -> tuple:
+    """
+    Get the lines that identify a heading block of a style, computed only the first time they are requested.
+    :param style: comment style of the language, i.e. one of the *_STYLE dicts.
+    :return: (first line, empty line, last line) of the block, as UTF-8 bytes without line separator.
+    """
+    return _compile_markers(style[START_KEY], style[FILLER_KEY], style[END_KEY])
+
+
+def block_newline(data: bytes, offset, distinctive: bytes) -> bytes:
+    """
+    Find the line separator of a heading block, which is written with the newline of its file: LF, CRLF or CR.
+    :param data: beginning of the file.
+    :param offset: offset of the block in data.
+    :param distinctive: first line of the block, as returned by get_heading_markers.
+    :return: the separator following the first line of the block, or None if data does not hold that line there.
+    """
+    end = offset + len(distinctive)
+    if not data.startswith(distinctive, offset):
+        return None
+    if data.startswith(b'\r\n', end):
+        return b'\r\n'
+    if data.startswith(b'\r', end):
+        return b'\r'
+    if data.startswith(b'\n', end):
+        return b'\n'
+    return None
+
+
+class FileResult:
+    def __init__(self, path, status, error=None):
         """
-        Check if file has already been processed by this application before (contains a header).
+        Outcome of processing a single file.
+        :param path: path to the file.
+        :param status: one of HEADED, REFRESHED, STRIPPED, ALREADY_HEADED, MISSING, MALFORMED, SKIPPED or FAILED.
+        :param error: exception raised while processing the file, if it failed.
+        """
+        self.path = path
+        self.status = status
+        self.error = error
+        # Seconds spent in each phase, and bytes read and written, while processing the file.
+        self.timings = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        # With group commit, (temporary file to rename over the file, real path to the file) until the rewrite is
+        # committed by a CommitGroup. The temporary file is None when the file was edited in place.
+        self.pending = None
+
+    def __repr__(self):
+        return 'FileResult({0!r}, {1!r}, {2!r})'.format(self.path, self.status, self.error)
+
+class PhaseClock:
+    __slots__ = ('timings', 'profiler', 'started')
+
+    def __init__(self, timings, profiler=None):
+        """
+        Measures the time spent in the phases of processing a file.
+        :param timings: dict the seconds spent in each phase are added to.
+        :param profiler: cProfile.Profile enabled while a phase runs, if any.
+        """
+        self.timings = timings
+        self.profiler = profiler
+        self.started = 0.0
+
+    def start(self):
+        if self.profiler:
+            self.profiler.enable()
+        self.started = perf_counter()
+
+    def stop(self, phase):
+        self.timings[phase] = self.timings.get(phase, 0.0) + perf_counter() - self.started
+        if self.profiler:
+            self.profiler.disable()
+
+class RunStats:
+    def __init__(self, hooks=(), profiler=None):
+        """
+        Counters and time spent per phase over a run of a HeadingGenerator. Cheap enough to always be collected.
+        :param hooks: callables called with (phase, seconds, path) every time a phase completes. path is None
+        for the walk phase.
+        :param profiler: cProfile.Profile enabled around each phase. Only used when files are processed in the
+        calling thread, i.e. with a single worker.
+        """
+        self.hooks = list(hooks)
+        self.profiler = profiler
+        self.files_scanned = 0
+        self.files_matched = 0
+        self.files_unchanged = 0
+        self.files_already_headed = 0
+        self.files_headed = 0
+        self.files_refreshed = 0
+        self.files_stripped = 0
+        # Files left alone because they have no heading, or a damaged one, when refreshing or stripping headings.
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.cancelled = False
+
+    def add_time(self, phase, seconds, path=None):
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + seconds
+        for hook in self.hooks:
+            hook(phase, seconds, path)
+
+    def timed(self, iterable, phase):
+        """
+        Iterate over iterable, counting the time spent producing each item towards a phase.
+        :return: generator of the items of iterable.
+        """
+        iterator = iter(iterable)
+        while True:
+            started = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(phase, perf_counter() - started)
+                return
+            self.add_time(phase, perf_counter() - started)
+            yield item
+
+    def record(self, result):
+        """
+        Add the outcome of processing a file to the counters.
+        :param result: FileResult
+        """
+        if result.status == HEADED:
+            self.files_headed += 1
+        elif result.status == REFRESHED:
+            self.files_refreshed += 1
+        elif result.status == STRIPPED:
+            self.files_stripped += 1
+        elif result.status == FAILED:
+            self.files_failed += 1
+        elif result.status == ALREADY_HEADED:
+            self.files_already_headed += 1
+        else:
+            self.files_skipped += 1
+        self.bytes_read += result.bytes_read
+        self.bytes_written += result.bytes_written
+        for (phase, seconds) in result.timings.items():
+            self.add_time(phase, seconds, result.path)
+
+    def to_dict(self) -> dict:
+        counters = {key: value for (key, value) in self.__dict__.items() if key.startswith(('files_', 'bytes_'))}
+        return dict(counters, phase_times=dict(self.phase_times), cancelled=self.cancelled)
+
+    def __repr__(self):
+        return 'RunStats({0!r})'.format(self.to_dict())
+
+class CommitGroup:
+    def __init__(self, on_commit=None, journal=None, size=GROUP_COMMIT_SIZE, staging_path=None):
+        """
+        Completes the rewrites of files processed with DURABILITY_GROUP in batches: the temporary files of a batch are
+        flushed to disk, then renamed over the originals, then their directories are flushed, each directory once.
+        :param on_commit: callable called with each FileResult once its file is committed, or has failed.
+        :param journal: journal.Journal recording the files in flight, so an interrupted run can be recovered.
+        :param size: amount of files per batch.
+        :param staging_path: callable giving the (temporary file, real path) a file will be staged in, as
+        HeadingGenerator.staging_path does, for stage.
+        """
+        self.on_commit = on_commit
+        self.journal = journal
+        self.size = size
+        self.staging_path = staging_path
+        self.batch = []
+        # (temporary file, real path) of the files staged but not added yet, by path.
+        self.staged = {}
+        # Whether a batch is being renamed, in which case only the journal can tell which files are done.
+        self.committing = False
+
+    def stage(self, paths):
+        """
+        Record the temporary files some files are about to be staged in, before they are handed to the workers
+        creating them. With a journal, they are flushed to disk first.
+        :param paths: list of paths to the files.
+        """
+        entries = [self.staging_path(path) for path in paths]
+        self.staged.update(zip(paths, entries))
+        if self.journal is not None:
+            self.journal.stage(entries)
+
+    def add(self, result):
+        """
+        Add the outcome of processing a file, committing the batch once it is full.
+        :param result: FileResult, committed right away if it has nothing pending.
+        """
+        self.staged.pop(result.path, None)
+        if not result.pending:
+            if self.on_commit:
+                self.on_commit(result)
+            return
+        self.batch.append(result)
+        if len(self.batch) >= self.size:
+            self.flush()
+
+    def flush(self):
+        """
+        Commit the files added since the last flush.
+        """
+        batch = self.batch
+        if not batch:
+            return
+        started = perf_counter()
+        durable = []
+        for result in batch:
+            try:
+                fsync_path(result.pending[0] or result.pending[1])
+                durable.append(result)
+            except OSError as e:
+                self.fail(result, e)
+        # From here on the new contents survive a crash, and the journal says so.
+        if self.journal is not None:
+            self.journal.commit([result.pending[0] for result in durable if result.pending[0]])
+        self.committing = True
+
+        directories = set()
+        for result in durable:
+            (tmp_path, path) = result.pending
+            if tmp_path:
+                try:
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    self.fail(result, e)
+                    continue
+            directories.add(os.path.dirname(path))
+        for directory in directories:
+            try:
+                fsync_path(directory)
+            except OSError:
+                pass
+        if self.journal is not None:
+            self.journal.clear(self.staged.values())
+        self.committing = False
+        self.batch = []
+
+        elapsed = (perf_counter() - started) / len(batch)
+        for result in batch:
+            result.timings[WRITE_PHASE] = result.timings.get(WRITE_PHASE, 0.0) + elapsed
+            if result.pending:
+                result.pending = None
+                if self.on_commit:
+                    self.on_commit(result)
+
+    def fail(self, result, error):
+        if result.pending[0]:
+            discard_file(result.pending[0])
+        result.pending = None
+        result.status = FAILED
+        result.error = error
+        result.bytes_written = 0
+        if self.on_commit:
+            self.on_commit(result)
+
+    def close(self):
+        """
+        Commit the files added since the last flush, once every file has been processed. Files staged but never
+        processed, as when a run is cancelled, are forgotten.
+        """
+        for (tmp_path, _) in self.staged.values():
+            discard_file(tmp_path)
+        self.staged = {}
+        self.flush()
+        if self.journal is not None:
+            self.journal.clear()
+
+    def discard(self):
+        """
+        Give up on the files added since the last flush and on those staged but not added, leaving them as they
+        were before the run. A batch interrupted while being renamed is left for the journal to recover, if there
+        is one.
+        """
+        if self.committing and self.journal is not None:
+            return
+        for result in self.batch:
+            if result.pending and result.pending[0]:
+                discard_file(result.pending[0])
+            result.pending = None
+        self.batch = []
+        for (tmp_path, _) in self.staged.values():
+            discard_file(tmp_path)
+        self.staged = {}
+        if self.journal is not None:
+            self.journal.clear()
+
+class DirectorySigningError(Exception):
+    def __init__(self, failures, stats=None):
+        """
+        :param failures: list of FileResult for the files that could not be processed.
+        :param stats: RunStats of the run.
+        """
+        self.failures = failures
+        self.stats = stats
+        super().__init__('{0} file(s) could not be signed: '.format(len(failures)) +
+                         ', '.join('{0} ({1})'.format(f.path, f.error) for f in failures))
+
+class HeadingGenerator:
+    def __init__(self, path: str, language_str: str, durability=DURABILITY_NONE):
+        """
+        :param path: path to root of directory to walk through
+        :param language_str: name of the language of the source files, or AUTO_NAME to handle the source files of
+        every supported language, each styled according to its extension.
+        :param durability: DURABILITY_NONE, DURABILITY_FSYNC or DURABILITY_GROUP. Group commit only applies to
+        directories; single files are then flushed as with DURABILITY_FSYNC.
+        """
+        if durability not in DURABILITIES:
+            raise ValueError('unknown durability mode: {0}'.format(durability))
+        self.path = path
+        self.durability = durability
+        self.auto_detect = language_str == AUTO_NAME
+        self.language = None if self.auto_detect else self.get_language(language_str)
+        self.extensions = frozenset(LANGUAGES_BY_EXTENSION) if self.auto_detect else frozenset(self.language.extensions)
+        # Part of the names of the temporary files of a run with group commit, which are planned ahead by staging_path.
+        self.staging_token = None
+
+    def get_language(self, language_string: str) -> Language:
+        """
+        Get language object based on its string representation.
+        :param language_string:
+        :return: Language object.
+        """
+        return LANGUAGES_BY_NAME.get(language_string, None)
+
+    def detect_source_language(self, filename: str) -> Language:
+        """
+        Identify the language of a source file from its extension.
+        :param filename: name of or path to the file.
+        :return: Language object, or None if the extension is not one of a supported language.
+        """
+        return LANGUAGES_BY_EXTENSION.get(os.path.splitext(filename)[1][1:], None)
+
+    def language_for(self, path: str) -> Language:
+        """
+        Get the language the heading of a file has to be styled for.
+        :param path: path to the file.
+        :return: Language object, or None if the file is not a source file this generator handles.
+        """
+        if self.auto_detect:
+            return self.detect_source_language(path)
+        return self.language if os.path.splitext(path)[1][1:] in self.extensions else None
+
+    def prepend_text(self, path, blocks, file_format=None) -> int:
+        """
+        Insert text at the beginning of a file, after its byte order mark if it has one, without loading the file
+        into memory. Only the inserted text is encoded; the rest of the file is copied as is.
+        :param path: path to file to edit
+        :param file_format: FileFormat of the file, sniffed from its beginning by default.
+        :return: size of the edited file.
+        """
+        if file_format is None:
+            file_format = sniff_format(self.read_prefix(path))
+        return splice_file(path, file_format.bom + file_format.encode(blocks), len(file_format.bom),
+                           self.durability != DURABILITY_NONE)
+
+    def rewrite_file(self, path, header: bytes, skip, result) -> int:
+        """
+        Replace the first `skip` bytes of a file with `header` as splice_file does, as durably as requested.
+        With group commit the file is only staged, and result.pending set for a CommitGroup to complete the rewrite.
+        :param result: FileResult of the file.
+        :return: size of the rewritten file.
+        """
+        if self.durability == DURABILITY_GROUP:
+            tmp_path = self.staging_path(path)[0] if self.staging_token else None
+            (tmp_path, real_path, size) = stage_splice(path, header, skip, tmp_path=tmp_path)
+            result.pending = (tmp_path, real_path)
+            return size
+        return splice_file(path, header, skip, self.durability == DURABILITY_FSYNC)
+
+    def staging_path(self, path) -> tuple:
+        """
+        Work out the temporary file a file is staged in during a run with group commit, so that it can be journaled
+        before a worker creates it.
+        :param path: path to the file.
+        :return: (path to the temporary file, real path to the file).
+        """
+        real_path = os.path.realpath(path)
+        (directory, name) = os.path.split(real_path)
+        return os.path.join(directory, '.{0}.{1}.tmp'.format(name, self.staging_token)), real_path
+
+    def get_template(self, heading, year=None, language=None, newline=os.linesep) -> 'HeadingTemplate':
+        """
+        Get the compiled heading template for a language.
+        :param heading:
+        :param year: copyright year, the current one by default.
+        :param language: Language object, the selected language by default.
+        :param newline: line separator of the block.
+        :return: HeadingTemplate shared with any other file using the same style, heading and newline.
+        """
+        return get_heading_template((language or self.language).style, heading, year=year, newline=newline)
+
+    def render_heading(self, filename, heading, year=None, language=None, newline=os.linesep) -> str:
+        """
+        Render the heading block of a file.
+        :param filename: name of the file, which is shown centred in the block.
+        :param heading:
+        :param year: copyright year, the current one by default.
+        :param language: Language object, by default the selected language or the one detected from filename.
+        :param newline: line separator of the block.
+        :return: heading block, including the blank lines separating it from the rest of the file.
+        """
+        return self.get_template(heading, year, language or self.language_for(filename), newline).render(filename)
+
+    def insert_heading(self, path, heading, year=None):
+        """
+        Inserts a string of text at the beginning of a file formatted as a constant-width block.
+        The block uses the encoding and newline style of the file.
+        :param path: path to the file to edit
+        :param heading:
+        :param year: copyright year, the current one by default.
         :return:
         """
-        if os.path.getsize(filestream.name) == 0:
-            return False
+        file_format = sniff_format(self.read_prefix(path))
+        text = self.render_heading(os.path.split(path)[1], heading, year, newline=file_format.newline)
+        self.prepend_text(path, text, file_format)
+
+    def read_prefix(self, path) -> bytes:
+        """
+        Read the beginning of a file, which is where a heading would be.
+        :param path:
+        :return: at most HEADER_PROBE_SIZE bytes.
+        """
+        with open(path, 'rb', buffering=0) as fs:
+            return fs.read(HEADER_PROBE_SIZE)
 
+    def inspect_header(self, prefix: bytes, language=None) -> str:
+        """
+        Work out whether the beginning of a file holds a heading produced by this application.
+        :param prefix: first bytes of the file, as returned by read_prefix.
+        :param language: Language object of the file, the selected language by default.
+        :return: ALREADY_HEADED, MISSING or MALFORMED.
+        """
+        language = language or self.language
         # The distinctive is @@@ in line 1 of a file, after the
         # file language's comment start tokens (e.g. in C++, /*@@@; in Python, #@@@).
-        # If this is present, the file has been
-        # processed by this tool.
-        line = filestream.readline()
-        # We just want to get the first line, which is the one containing the distinctive.
-        # But we don't want to retrieve empty lines
-        # i.e. the file has been padded at the top (don't know why someone would want to do this
-        # but it's good defensive practice).
-
-        # If file is completely empty, add comments and leave.
-        while not line.strip():
-            line = filestream.readline()
-        # return all(map(lambda ln: ln.lstrip().startswith(self.language.style['start'] + HEADER_DISTINCTIVE), lines))
-        filestream.seek(0,0)
-        return line.lstrip().startswith(self.language.style['start'] + HEADER_DISTINCTIVE)
+        # If this is present, the file has been processed by this tool.
+        # Blank lines before it are ignored in case the file has been padded at the top.
+        text = prefix[len(UTF8_BOM):] if prefix.startswith(UTF8_BOM) else prefix
+        text = text.lstrip()
+        start = (language.style['start'] + HEADER_DISTINCTIVE).encode()
+        if not text.startswith(start):
+            return MISSING
+
+        # The heading ends with a line of filler characters; if it fits in the prefix but cannot be found,
+        # the heading has been edited or truncated.
+        (distinctive, _, filled_line) = get_heading_markers(language.style)
+        newline = block_newline(text, 0, distinctive)
+        if newline is None:
+            return MALFORMED
+        if len(prefix) < HEADER_PROBE_SIZE and filled_line not in text.split(newline):
+            return MALFORMED
+        return ALREADY_HEADED
+
+    def has_header(self, path) -> bool:
+        """
+        Check if file has already been processed by this application before (contains a header).
+        Only the first HEADER_PROBE_SIZE bytes of the file are read.
+        :param path:
+        :return:
+        """
+        return self.inspect_header(self.read_prefix(path), self.language_for(path)) != MISSING
+
+    def check_path(self, path) -> 'FileResult':
+        """
+        Check the heading of a single source file without modifying it.
+        :param path: path to the source file.
+        :return: FileResult with status ALREADY_HEADED, MISSING, MALFORMED or FAILED.
+        """
+        try:
+            prefix = self.read_prefix(path)
+            sniff_format(prefix)
+            return FileResult(path, self.inspect_header(prefix, self.language_for(path)))
+        except (OSError, ValueError) as e:
+            return FileResult(path, FAILED, e)
+
+    def comment_path(self, path, heading, year=None, profiler=None) -> 'FileResult':
+        """
+        Insert a heading in a single source file unless it already has one, capturing any error.
+        :param path: path to the source file.
+        :param heading:
+        :param year: copyright year, the current one by default.
+        :param profiler: cProfile.Profile to enable around each phase, if any.
+        :return: result of processing the file, with the time spent in each phase. Its status is SKIPPED if the path
+        is not a source file of the selected language.
+        """
+        language = self.language_for(path)
+        if language is None:
+            return FileResult(path, SKIPPED)
+        result = FileResult(path, FAILED)
+        clock = PhaseClock(result.timings, profiler)
+        try:
+            clock.start()
+            prefix = self.read_prefix(path)
+            headed = self.inspect_header(prefix, language) != MISSING
+            clock.stop(PROBE_PHASE)
+            result.bytes_read = len(prefix)
+            if headed:
+                result.status = ALREADY_HEADED
+                return result
+
+            clock.start()
+            file_format = sniff_format(prefix)
+            text = self.render_heading(os.path.split(path)[1], heading, year, language, file_format.newline)
+            block = file_format.bom + file_format.encode(text)
+            clock.stop(RENDER_PHASE)
+
+            clock.start()
+            size = self.rewrite_file(path, block, len(file_format.bom), result)
+            clock.stop(WRITE_PHASE)
+            result.bytes_read += size - len(block)
+            result.bytes_written = size
+            result.status = HEADED
+        except (OSError, ValueError) as e:
+            if profiler:
+                profiler.disable()
+            result.error = e
+        return result
 
     def comment_file(self, heading) -> bool:
-        if not os.path.isfile(self.path) or self.language.extensions.count(os.path.splitext(self.path)[1][1:]) == 0:
+        if not os.path.isfile(self.path) or not self.language_for(self.path):
             return False
-        with open(self.path, 'r+') as fs:
-            if not self.has_header(fs):
-                self.insert_heading(fs, heading)
+        if not self.has_header(self.path):
+            self.insert_heading(self.path, heading)
         return True
 
-    def comment_directory(self, heading, recurse=False) -> bool:
+    def locate_header(self, data: bytes, language=None):
+        """
+        Find the heading block at the beginning of a file.
+        :param data: beginning of the file, long enough to hold the whole block.
+        :param language: Language object of the file, the selected language by default.
+        :return: (offset of the block, offset past its end, description and remarks lines), or None if the data does
+        not start with a well-formed block.
+        """
+        (distinctive, empty_line, filled_line) = get_heading_markers((language or self.language).style)
+        bom = len(UTF8_BOM) if data.startswith(UTF8_BOM) else 0
+        start = len(data) - len(data[bom:].lstrip())
+        newline = block_newline(data, start, distinctive)
+        if newline is None:
+            return None
+        lines = []
+        end = start
+        while True:
+            line_end = data.find(newline, end)
+            if line_end == -1:
+                return None
+            lines.append(data[end:line_end])
+            end = line_end + len(newline)
+            if lines[-1] == filled_line:
+                break
+
+        # distinctive, empty, file name, empty, [description and remarks], empty, author, copyright, licence, filled
+        if len(lines) < 9 or lines[0] != distinctive or \
+                not lines[1] == lines[3] == lines[-5] == empty_line:
+            return None
+        # The block is followed by an empty line.
+        if data.startswith(newline, end):
+            end += len(newline)
+        return start, end, lines[4:-5]
+
+    def refresh_path(self, path, heading, year=None, profiler=None) -> 'FileResult':
+        """
+        Re-render the heading of a single source file with a new heading, keeping its description and remarks
+        unless the new heading has its own. When the new block has the same length as the old one, which is the
+        case when only the year changes, just the bytes that differ are overwritten in place; otherwise the file is
+        rewritten as when inserting a heading. Unlike a rewrite, overwriting in place is not atomic: a crash can leave
+        the block half-updated, and the bytes are only flushed to disk with DURABILITY_FSYNC or DURABILITY_GROUP.
+        :param path: path to the source file.
+        :param heading:
+        :param year: copyright year, the current one by default.
+        :param profiler: cProfile.Profile to enable around each phase, if any.
+        :return: FileResult with status REFRESHED, ALREADY_HEADED if the heading was up to date, MISSING, MALFORMED
+        or FAILED.
+        """
+        result = FileResult(path, FAILED)
+        clock = PhaseClock(result.timings, profiler)
+        try:
+            clock.start()
+            language = self.language_for(path)
+            with open(path, 'rb') as fs:
+                data = fs.read(MAX_HEADER_SIZE)
+            result.bytes_read = len(data)
+            result.status = self.inspect_header(data[:HEADER_PROBE_SIZE], language)
+            located = self.locate_header(data, language) if result.status != MISSING else None
+            clock.stop(PROBE_PHASE)
+            if not located:
+                result.status = MALFORMED if result.status != MISSING else MISSING
+                return result
+
+            clock.start()
+            (start, end, details) = located
+            # Same verdict as when the heading was inserted; the prefix is only the whole file if nothing follows it.
+            file_format = sniff_format(data[:HEADER_PROBE_SIZE], len(data) <= HEADER_PROBE_SIZE)
+            if not (heading.description or heading.remarks):
+                details = file_format.newline.join(file_format.decode(line) for line in details)
+            else:
+                details = None
+            template = self.get_template(heading, year, language, file_format.newline)
+            block = file_format.encode(template.render(os.path.split(path)[1], details))
+            clock.stop(RENDER_PHASE)
+
+            old_block = data[start:end]
+            if block == old_block:
+                result.status = ALREADY_HEADED
+                return result
+            clock.start()
+            if len(block) == len(old_block):
+                # Overwrite only the range that changed.
+                first = next(i for i in range(len(block)) if block[i] != old_block[i])
+                last = next(i for i in range(len(block) - 1, -1, -1) if block[i] != old_block[i]) + 1
+                with open(path, 'r+b') as fs:
+                    fs.seek(start + first)
+                    fs.write(block[first:last])
+                    if self.durability == DURABILITY_FSYNC:
+                        fs.flush()
+                        os.fsync(fs.fileno())
+                if self.durability == DURABILITY_GROUP:
+                    result.pending = (None, os.path.realpath(path))
+                result.bytes_written = last - first
+            else:
+                size = self.rewrite_file(path, data[:start] + block, end, result)
+                result.bytes_read += size - start - len(block)
+                result.bytes_written = size
+            clock.stop(WRITE_PHASE)
+            result.status = REFRESHED
+        except (OSError, ValueError) as e:
+            if profiler:
+                profiler.disable()
+            result.error = e
+        return result
+
+    def refresh_file(self, heading) -> 'FileResult':
+        """
+        Re-render the heading of the source file with a new heading.
+        :return: FileResult, or None if the path is not a source file of the selected language.
+        """
+        if not os.path.isfile(self.path) or not self.language_for(self.path):
+            return None
+        return self.refresh_path(self.path, heading)
+
+    def strip_path(self, path, heading=None, year=None, profiler=None) -> 'FileResult':
+        """
+        Remove the heading of a single source file, along with the empty line that follows it. The rest of the file
+        is copied as is, without being loaded into memory.
+        :param path: path to the source file.
+        :param heading: unused, for compatibility with the other per-file methods.
+        :param year: unused.
+        :param profiler: cProfile.Profile to enable around each phase, if any.
+        :return: FileResult with status STRIPPED, MISSING, MALFORMED or FAILED.
+        """
+        result = FileResult(path, FAILED)
+        clock = PhaseClock(result.timings, profiler)
+        try:
+            clock.start()
+            language = self.language_for(path)
+            with open(path, 'rb') as fs:
+                data = fs.read(MAX_HEADER_SIZE)
+            result.bytes_read = len(data)
+            result.status = self.inspect_header(data[:HEADER_PROBE_SIZE], language)
+            located = self.locate_header(data, language) if result.status != MISSING else None
+            clock.stop(PROBE_PHASE)
+            if not located:
+                result.status = MALFORMED if result.status != MISSING else MISSING
+                return result
+
+            clock.start()
+            (start, end, _) = located
+            # Whatever precedes the block, such as a byte order mark, stays.
+            size = self.rewrite_file(path, data[:start], end, result)
+            clock.stop(WRITE_PHASE)
+            result.bytes_read += size - start
+            result.bytes_written = size
+            result.status = STRIPPED
+        except (OSError, ValueError) as e:
+            if profiler:
+                profiler.disable()
+            result.error = e
+        return result
+
+    def strip_file(self) -> 'FileResult':
+        """
+        Remove the heading of the source file.
+        :return: FileResult, or None if the path is not a source file of the selected language.
+        """
+        if not os.path.isfile(self.path) or not self.language_for(self.path):
+            return None
+        return self.strip_path(self.path)
+
+    def get_scanner(self, recurse=False, ignore_files=()) -> 'TreeScanner':
+        """
+        :param recurse: whether to look into subdirectories as well.
+        :param ignore_files: paths to more .gitignore-style files applying to the whole tree.
+        :return: TreeScanner finding the source files this generator handles.
+        """
+        from scanner import TreeScanner
+        return TreeScanner(self.extensions, recurse, extra_ignore_files=ignore_files)
+
+    def scan(self, recurse=False, ignore_files=()):
+        """
+        Find the source files of the selected language in the directory as the tree is walked.
+        Version control, dependency and build directories are skipped, as is anything matched by .gitignore files.
+        :param recurse: whether to look into subdirectories as well.
+        :param ignore_files: paths to more .gitignore-style files applying to the whole tree.
+        :return: generator of os.DirEntry for the source files.
+        """
+        return self.get_scanner(recurse, ignore_files).scan(self.path)
+
+    def find_source_files(self, recurse=False, ignore_files=()) -> list:
+        """
+        Find the source files of the selected language in the directory.
+        :param recurse: whether to look into subdirectories as well.
+        :param ignore_files: paths to more .gitignore-style files applying to the whole tree.
+        :return: list of paths to source files, in the order they were found.
+        """
+        return [entry.path for entry in self.scan(recurse, ignore_files)]
+
+    def imap_files(self, function, files, workers=1, processes=False, *args, cancel=None, before_submit=None,
+                   chunk_size=None):
+        """
+        Apply a per-file method to some files, optionally spreading them across a pool of workers, and hand out the
+        results as soon as they are ready. Files are taken from the iterable only as workers free up, so processing
+        starts while a scan producing them is still running and no more than a few batches are ever read ahead.
+        :param function: method of this generator taking a path followed by args.
+        :param files: iterable of paths to the files.
+        :param workers: number of workers. With 1 the files are processed in the calling thread.
+        :param processes: use worker processes instead of threads.
+        :param args: extra arguments passed to function after the path.
+        :param cancel: threading.Event; once set, no more files are started. Files already being processed are
+        finished and handed out.
+        :param before_submit: callable called in the calling thread with each batch of files, as a list, before any
+        of them is processed.
+        :param chunk_size: amount of files per batch. By default PROCESS_CHUNK_SIZE with processes, to amortise the
+        cost of pickling the generator and arguments, and 1 otherwise.
+        :return: generator of results, in the same order as files regardless of which worker processed them.
+        """
+        from itertools import islice
+        if not chunk_size:
+            chunk_size = PROCESS_CHUNK_SIZE if processes else 1
+        iterator = iter(files)
+        if workers <= 1:
+            while cancel is None or not cancel.is_set():
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                if before_submit:
+                    before_submit(chunk)
+                for file in chunk:
+                    if cancel is not None and cancel.is_set():
+                        break
+                    yield function(file, *args)
+            return
+
+        from collections import deque
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        in_flight = deque()
+        with executor_class(max_workers=workers) as executor:
+            try:
+                while True:
+                    # Keep every worker busy, with one batch waiting for each, but read no further ahead.
+                    while len(in_flight) < workers * 2 and (cancel is None or not cancel.is_set()):
+                        chunk = list(islice(iterator, chunk_size))
+                        if not chunk:
+                            break
+                        if before_submit:
+                            before_submit(chunk)
+                        in_flight.append(executor.submit(self.apply_batch, function, chunk, *args))
+                    if not in_flight:
+                        break
+                    future = in_flight.popleft()
+                    if cancel is not None and cancel.is_set() and future.cancel():
+                        continue
+                    yield from future.result()
+            except BaseException:
+                # Including GeneratorExit when the caller stops early: the batches not started yet never will be,
+                # and leaving the executor waits for the others.
+                for future in in_flight:
+                    future.cancel()
+                raise
+
+    def apply_batch(self, function, paths, *args) -> list:
+        """
+        Apply a per-file method to a few files, as a single task for a worker.
+        :return: list of results, in the order of paths.
+        """
+        return [function(path, *args) for path in paths]
+
+    def map_files(self, function, files, workers=1, processes=False, *args, on_result=None, cancel=None,
+                  before_submit=None, chunk_size=None) -> list:
+        """
+        Apply a per-file method to some files, optionally spreading them across a pool of workers. Files are read
+        ahead by a few batches at most, as with imap_files.
+        :param on_result: callable called in the calling thread with each result, in order, as soon as it is ready.
+        Other arguments as for imap_files.
+        :return: list of results, in the same order as files regardless of which worker processed them.
+        """
+        results = []
+        iterator = self.imap_files(function, files, workers, processes, *args, cancel=cancel,
+                                   before_submit=before_submit, chunk_size=chunk_size)
+        try:
+            for result in iterator:
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        finally:
+            iterator.close()
+        return results
+
+    def comment_paths(self, paths, heading, workers=1, processes=False, stats=None, journal=None):
+        """
+        Insert headings in any files, e.g. from find -print0, a build system or an IDE, without being bound to the
+        path of the generator. Paths are consumed lazily and results come out as soon as they are ready, so the caller
+        can process them as they go; with several workers, only a bounded amount of paths is read ahead.
+        :param paths: iterable of paths to files. Those that are not source files of the selected language are
+        skipped.
+        :param heading: its description and remarks are not used, as for a directory.
+        :param workers: number of files processed concurrently.
+        :param processes: use a pool of processes instead of threads when workers > 1.
+        :param stats: RunStats each result is recorded in.
+        :param journal: journal.Journal recording the files in flight with DURABILITY_GROUP.
+        :return: generator of FileResult with status HEADED, ALREADY_HEADED, SKIPPED or FAILED, in the order of paths.
+        With group commit, a result only comes out once its file is committed.
+        """
+        from collections import deque
+        heading.description = ''
+        heading.remarks = ''
+        year = current_year()
+        ready = deque()
+        on_commit = ready.append
+        if stats is not None:
+            on_commit = lambda result: (stats.record(result), ready.append(result))
+        profiler = stats.profiler if stats is not None and workers <= 1 else None
+        if self.durability == DURABILITY_GROUP:
+            group = self.start_group(on_commit, journal)
+            results = self.imap_files(self.comment_path, paths, workers, processes, heading, year, profiler,
+                                      before_submit=group.stage, chunk_size=PROCESS_CHUNK_SIZE)
+        else:
+            group = CommitGroup(on_commit)
+            results = self.imap_files(self.comment_path, paths, workers, processes, heading, year, profiler)
+
+        try:
+            for result in results:
+                group.add(result)
+                while ready:
+                    yield ready.popleft()
+            group.close()
+            while ready:
+                yield ready.popleft()
+        except BaseException:
+            # Including GeneratorExit when the caller stops early: files staged but not committed are left as they were.
+            results.close()
+            group.discard()
+            raise
+        finally:
+            self.staging_token = None
+
+    def process_files(self, files, heading, workers=1, processes=False, on_result=None, cancel=None,
+                      profiler=None, function=None, group=None) -> list:
+        """
+        Insert headings in a list of source files, optionally spreading them across a pool of workers.
+        :param files: iterable of paths to the source files.
+        :param heading:
+        :param workers: number of workers. With 1 the files are processed in the calling thread.
+        :param processes: use worker processes instead of threads.
+        :param on_result: callable called with each FileResult as soon as it is ready.
+        :param cancel: threading.Event stopping the processing between files once set.
+        :param profiler: cProfile.Profile enabled around each phase of each file. Ignored with several workers.
+        :param function: per-file method taking (path, heading, year, profiler), comment_path by default.
+        :param group: CommitGroup from start_group the results are added to with DURABILITY_GROUP, instead of being
+        passed to on_result.
+        :return: list of FileResult, in the same order as files regardless of which worker processed them.
+        """
+        # Fix the year once for the whole batch so every file shares the same compiled template.
+        year = current_year()
+        if workers > 1:
+            profiler = None
+        if group is None:
+            return self.map_files(function or self.comment_path, files, workers, processes, heading, year, profiler,
+                                  on_result=on_result, cancel=cancel)
+        # Temporary files are planned and journaled a batch at a time, so that the journal is flushed once per batch.
+        return self.map_files(function or self.comment_path, files, workers, processes, heading, year, profiler,
+                              on_result=group.add, cancel=cancel, before_submit=group.stage,
+                              chunk_size=PROCESS_CHUNK_SIZE)
+
+    def start_group(self, on_commit=None, journal=None) -> 'CommitGroup':
+        """
+        Start a run with group commit, whose temporary files get names of their own, planned ahead by staging_path.
+        :param on_commit: callable called with each FileResult once its file is committed, or has failed.
+        :param journal: journal.Journal recording the files in flight.
+        :return: CommitGroup to stage and add the files of the run to.
+        """
+        self.staging_token = os.urandom(6).hex()
+        return CommitGroup(on_commit, journal, staging_path=self.staging_path)
+
+    def check_file(self) -> 'FileResult':
+        """
+        Check the heading of the source file without modifying it.
+        :return: FileResult, or None if the path is not a source file of the selected language.
+        """
+        if not os.path.isfile(self.path) or not self.language_for(self.path):
+            return None
+        return self.check_path(self.path)
+
+    def check_directory(self, recurse=False, workers=1, processes=False, ignore_files=()) -> list:
+        """
+        Check the headings of all the source files of the selected language in the directory without modifying them.
+        :param recurse: whether to check subdirectories as well.
+        :param workers: number of files checked concurrently.
+        :param processes: use a pool of processes instead of threads when workers > 1.
+        :param ignore_files: paths to more .gitignore-style files applying to the whole tree.
+        :return: list of FileResult in scan order, or None if the path is not a directory.
+        """
+        if not os.path.isdir(self.path):
+            return None
+        paths = (entry.path for entry in self.scan(recurse, ignore_files))
+        return self.map_files(self.check_path, paths, workers, processes)
+
+    def manifest_fingerprint(self, heading) -> str:
+        """
+        Summary of the parameters headings are generated with, used to invalidate a Manifest when they change.
+        :param heading:
+        :return:
+        """
+        languages = LANGUAGES if self.auto_detect else (self.language,)
+        styles = [language.name + ':' + ''.join(language.style[key] for key in (START_KEY, FILLER_KEY, END_KEY))
+                  for language in languages]
+        return '\0'.join(styles + [HEADER_DISTINCTIVE, str(HEADING_WIDTH), heading.author, heading.licence])
+
+    def skip_unchanged(self, entries, manifest, stats, run_stats=None):
+        """
+        Filter out the files a manifest records as having a heading and which have not changed since.
+        :param entries: iterable of os.DirEntry, as returned by scan.
+        :param manifest: Manifest
+        :param stats: dict filled with the stat results of the files let through, by path.
+        :param run_stats: RunStats counting the files skipped.
+        :return: generator of paths to the files that need to be processed.
+        """
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except OSError:
+                yield entry.path
+                continue
+            if not manifest.is_unchanged(entry.path, st):
+                stats[entry.path] = st
+                yield entry.path
+            elif run_stats:
+                run_stats.files_unchanged += 1
+
+    def comment_directory(self, heading, recurse=False, workers=1, processes=False, ignore_files=(),
+                          manifest=None, progress=None, cancel=None, stats=None, journal=None) -> 'RunStats':
+        """
+        Insert headings in all the source files of the selected language in the directory.
+        Every file is processed even if some of them fail; the failures are then reported together.
+        :param heading:
+        :param recurse: whether to process subdirectories as well.
+        :param workers: number of files processed concurrently.
+        :param processes: use a pool of processes instead of threads when workers > 1.
+        :param ignore_files: paths to more .gitignore-style files applying to the whole tree.
+        :param manifest: Manifest of the files known to have a heading. Files it records as unchanged are skipped
+        without being opened, and the files found or given a heading are added to it.
+        :param progress: callable called with (files done, total files, FileResult) after each file. When given, all
+        the files are found before processing starts so that the total is known.
+        :param cancel: threading.Event; once set, processing stops cleanly between files.
+        :param stats: RunStats to collect the statistics of the run in, e.g. to set hooks or a profiler on it.
+        :param journal: journal.Journal recording the files in flight with DURABILITY_GROUP, so that a run that is
+        killed can be recovered with Journal.recover. It must have been recovered if it was not empty.
+        :return: False if the path is not a directory, otherwise the RunStats of the run.
+        :raises DirectorySigningError: if any of the files could not be processed. Its stats attribute holds the
+        RunStats of the run.
+        """
+        return self.process_directory(self.comment_path, heading, recurse, workers, processes, ignore_files, manifest,
+                                      progress, cancel, stats, journal)
+
+    def refresh_directory(self, heading, recurse=False, workers=1, processes=False, ignore_files=(),
+                          progress=None, cancel=None, stats=None, journal=None) -> 'RunStats':
+        """
+        Re-render the existing headings of all the source files of the selected language in the directory, e.g. to
+        update the copyright year, author or licence. The description and remarks of each file are kept.
+        Files without a heading are left alone. Arguments as for comment_directory.
+        :return: False if the path is not a directory, otherwise the RunStats of the run.
+        :raises DirectorySigningError: if any of the files could not be processed.
+        """
+        return self.process_directory(self.refresh_path, heading, recurse, workers, processes, ignore_files, None,
+                                      progress, cancel, stats, journal)
+
+    def strip_directory(self, recurse=False, workers=1, processes=False, ignore_files=(), progress=None, cancel=None,
+                        stats=None, journal=None) -> 'RunStats':
+        """
+        Remove the headings of all the source files of the selected language in the directory, e.g. to back out a
+        run or before moving to another heading format. Files without a heading, or with a damaged one, are left
+        alone. Arguments as for comment_directory.
+        :return: False if the path is not a directory, otherwise the RunStats of the run.
+        :raises DirectorySigningError: if any of the files could not be processed.
+        """
+        return self.process_directory(self.strip_path, None, recurse, workers, processes, ignore_files, None,
+                                      progress, cancel, stats, journal)
+
+    def comment_changes(self, heading, since=None, staged=False, untracked=False, recurse=True, workers=1,
+                        processes=False, progress=None, cancel=None, stats=None, journal=None) -> 'RunStats':
+        """
+        Insert headings in the source files of the selected language that a change touches, as told by the git
+        repository the directory is in, instead of walking the whole directory. Meant for pre-commit hooks and pull
+        request pipelines. At least one of since, staged and untracked should be given.
+        :param heading:
+        :param since: sign the files changed or added since this commit or ref, committed or not.
+        :param staged: sign the files staged in the index.
+        :param untracked: sign the untracked files that are not ignored.
+        :param recurse: whether to sign files in subdirectories as well.
+        Other arguments as for comment_directory.
+        :return: False if the path is not a directory, otherwise the RunStats of the run.
+        :raises gitfiles.GitError: if the directory is not in a git working tree or git fails.
+        :raises DirectorySigningError: if any of the files could not be processed.
+        """
         if not os.path.isdir(self.path):
             return False
+        stats = stats if stats is not None else RunStats()
+        started = perf_counter()
+        paths = self.find_changed_files(since, staged, untracked, recurse)
+        stats.add_time(WALK_PHASE, perf_counter() - started)
+        return self.process_directory(self.comment_path, heading, recurse, workers, processes, progress=progress,
+                                      cancel=cancel, stats=stats, journal=journal, paths=paths)
+
+    def find_changed_files(self, since=None, staged=False, untracked=False, recurse=True) -> list:
+        """
+        Find the source files of the selected language a change touches, as told by the git repository the
+        directory is in. Hidden files are left out, as when scanning the directory.
+        Arguments as for comment_changes.
+        :return: list of paths to the source files.
+        """
+        import gitfiles
+        scanner = self.get_scanner(recurse)
+        return [path for path in gitfiles.changed_paths(self.path, since, staged, untracked)
+                if (recurse or os.path.dirname(os.path.relpath(path, self.path)) == '')
+                and scanner.is_source_file(os.path.basename(path)) and os.path.isfile(path)]
+
+    def process_directory(self, function, heading, recurse=False, workers=1, processes=False, ignore_files=(),
+                          manifest=None, progress=None, cancel=None, stats=None, journal=None,
+                          paths=None) -> 'RunStats':
+        """
+        Apply a per-file method to all the source files of the selected language in the directory.
+        :param function: per-file method taking (path, heading, year, profiler) and returning a FileResult.
+        :param heading: Heading passed to function, None for functions not using it.
+        :param paths: iterable of paths to the source files to process instead of scanning the directory. The
+        manifest is not used then.
+        Other arguments as for comment_directory.
+        """
+        if not os.path.isdir(self.path):
+            return False
+        stats = stats if stats is not None else RunStats()
 
         # Eliminate file-specific information from the heading
-        heading.description = ''
-        heading.remarks = ''
+        if heading is not None:
+            heading.description = ''
+            heading.remarks = ''
 
-        source_file_regex = r'[A-Za-z0-9-_]+\.(' + '|'.join(self.language.extensions) + ')'
-        if recurse:
-            for (dirname, subdirs, files) in os.walk(self.path):
-                # Open the source files for the selected language, filtering out files without an extension.
-                for match in [m for m in map(lambda f: re.match(source_file_regex, f), files) if m]:
-                    with open(dirname + os.sep + match.string, 'r+') as fs:
-                        if not self.has_header(fs):
-                            self.insert_heading(fs, heading)
+        scanner = None
+        file_stats = {}
+        if paths is not None:
+            manifest = None
+        elif manifest is None:
+            scanner = self.get_scanner(recurse, ignore_files)
+            paths = (entry.path for entry in scanner.scan(self.path))
         else:
-            # Get all files with matching extensions in the current directory and insert headings in them.
-            for ext in self.language.extensions:
-                for file in (glob.glob(self.path + os.sep + '*.' + ext)):
-                    with open(file, 'r+') as fs:
-                        if not self.has_header(fs):
-                            self.insert_heading(fs, heading)
-        return True
+            scanner = self.get_scanner(recurse, ignore_files)
+            paths = self.skip_unchanged(scanner.scan(self.path), manifest, file_stats, stats)
+        paths = stats.timed(paths, WALK_PHASE)
+        done = count(1)
+        if progress is not None:
+            paths = list(paths)
+            on_result = lambda result: (stats.record(result), progress(next(done), len(paths), result))
+        else:
+            on_result = stats.record
+
+        if self.durability == DURABILITY_GROUP:
+            # Files only count as done once their batch is committed.
+            group = self.start_group(on_result, journal)
+            try:
+                results = self.process_files(paths, heading, workers, processes, None, cancel, stats.profiler,
+                                             function, group)
+                group.close()
+            except BaseException:
+                group.discard()
+                raise
+            finally:
+                self.staging_token = None
+        else:
+            results = self.process_files(paths, heading, workers, processes, on_result, cancel, stats.profiler,
+                                         function)
+        stats.files_scanned = scanner.entries_scanned if scanner else len(results)
+        stats.files_matched = len(results) + stats.files_unchanged
+        stats.cancelled = cancel is not None and cancel.is_set()
+        if manifest is not None:
+            for result in results:
+                try:
+                    if result.status == ALREADY_HEADED and result.path in file_stats:
+                        manifest.record(result.path, file_stats[result.path])
+                    elif result.status in (HEADED, ALREADY_HEADED):
+                        manifest.record(result.path, os.stat(result.path))
+                except OSError:
+                    pass
+            manifest.save()
+
+        failures = [result for result in results if result.status == FAILED]
+        if failures:
+            raise DirectorySigningError(failures, stats)
+        return stats
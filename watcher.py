@@ -0,0 +1,347 @@
+"""
+Watches a project directory and inserts headings in the source files created in it, or moved into it, once their
+writes have settled. Uses inotify on Linux and falls back to polling the tree elsewhere, or when the system runs out
+of inotify watches.
+"""
+
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+import treewalker
+
+INOTIFY_BACKEND = 'inotify'
+POLLING_BACKEND = 'poll'
+# Seconds a file has to go without being written to before it is signed.
+DEFAULT_SETTLE_TIME = 1.0
+# Seconds between two scans of the tree by the polling backend.
+DEFAULT_POLL_INTERVAL = 2.0
+# Longest time the watcher blocks waiting for events, so that it notices when it is asked to stop.
+MAX_WAIT = 0.5
+
+# Kinds of events the backends report: a file that appeared, by being created or moved in, a file written to or
+# replaced, and a file that is gone.
+CREATED = 'created'
+CHANGED = 'changed'
+REMOVED = 'removed'
+
+# inotify flags, from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | \
+    IN_MOVE_SELF | IN_ONLYDIR
+# struct inotify_event: watch descriptor, mask, cookie and length of the name that follows.
+EVENT_HEADER = struct.Struct('iIII')
+# Room for a few hundred events per read.
+READ_SIZE = 64 * 1024
+
+
+class InotifyBackend:
+    def __init__(self, root, scanner):
+        """
+        Reports the source files created, moved in, written to or removed under a directory, with one inotify watch
+        per directory of the tree.
+        :param root: path to the directory to watch.
+        :param scanner: scanner.TreeScanner deciding which directories are watched and which files reported.
+        :raises OSError: if inotify is not available, or with ENOSPC if the tree needs more watches than the system
+        allows (see /proc/sys/fs/inotify/max_user_watches). Directories created later that cannot be watched for
+        the same reason set out_of_watches instead.
+        """
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.get_errno = ctypes.get_errno
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            error = self.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.root = root
+        self.scanner = scanner
+        # Directory path, path relative to the root and ignore rules in force in it, by watch descriptor.
+        self.directories = {}
+        # Watch descriptor of each watched directory, by path.
+        self.watches = {}
+        # Names of the source files in each directory of the tree, by path, to tell new files from existing ones.
+        self.files = {}
+        # Set once a directory could not be watched because the system is out of watches.
+        self.out_of_watches = False
+        try:
+            self.watch_tree(root)
+        except BaseException:
+            self.close()
+            raise
+        if self.out_of_watches:
+            self.close()
+            raise OSError(errno.ENOSPC, 'out of inotify watches')
+
+    def watch_tree(self, directory, reldir='', rules=None, report=False) -> list:
+        """
+        Add watches on a directory and on the directories under it that are not watched yet, and take note of the
+        source files in them.
+        :param report: report the source files not known before, as when a directory is created or moved into the
+        tree, or when events were lost.
+        :return: list of (CREATED, path) events for the source files reported.
+        """
+        events = []
+        for (path, relpath, local_rules, files) in self.scanner.walk(directory, reldir, rules):
+            if path not in self.watches and not self.out_of_watches:
+                wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+                if wd >= 0:
+                    self.directories[wd] = (path, relpath, local_rules)
+                    self.watches[path] = wd
+                elif self.get_errno() == errno.ENOSPC:
+                    self.out_of_watches = True
+                # Otherwise it was removed or made unreadable since it was listed.
+            known = self.files.get(path, ())
+            names = set()
+            for entry in files:
+                names.add(entry.name)
+                if report and entry.name not in known:
+                    events.append((CREATED, entry.path))
+            self.files[path] = names
+        return events
+
+    def read(self, timeout) -> list:
+        """
+        Wait for changes.
+        :param timeout: longest time to wait, in seconds.
+        :return: list of (CREATED, CHANGED or REMOVED, path) events.
+        """
+        (readable, _, _) = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, READ_SIZE)
+        events = []
+        offset = 0
+        while offset < len(data):
+            (wd, mask, _, length) = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: look for the files and directories that appeared in the meantime.
+                events.extend(self.watch_tree(self.root, report=True))
+                continue
+            watched = self.directories.get(wd)
+            if watched is None:
+                continue
+            if mask & IN_IGNORED:
+                # The watch is gone along with the directory, or was removed by unwatch_tree.
+                self.forget(wd)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Handled through the event of the parent directory.
+                continue
+
+            (directory, reldir, rules) = watched
+            name = os.fsdecode(name)
+            path = os.path.join(directory, name)
+            relpath = reldir + '/' + name if reldir else name
+            if mask & IN_ISDIR:
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.unwatch_tree(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO) and self.scanner.is_walked_directory(rules, relpath, name):
+                    events.extend(self.watch_tree(path, relpath, rules, report=True))
+            elif self.scanner.is_selected_file(rules, relpath, name):
+                names = self.files.setdefault(directory, set())
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    names.discard(name)
+                    events.append((REMOVED, path))
+                elif mask & (IN_CREATE | IN_MOVED_TO) and name not in names:
+                    names.add(name)
+                    events.append((CREATED, path))
+                else:
+                    # Written to, or replaced by a file moved over it, as editors save files.
+                    events.append((CHANGED, path))
+        return events
+
+    def unwatch_tree(self, directory):
+        """
+        Remove the watches on a directory and on the directories under it, e.g. once it is moved elsewhere.
+        """
+        prefix = os.path.join(directory, '')
+        for (path, wd) in list(self.watches.items()):
+            if path == directory or path.startswith(prefix):
+                self.forget(wd)
+                self.libc.inotify_rm_watch(self.fd, wd)
+        for path in [path for path in self.files if path == directory or path.startswith(prefix)]:
+            del self.files[path]
+
+    def forget(self, wd):
+        watched = self.directories.pop(wd, None)
+        if watched and self.watches.get(watched[0]) == wd:
+            del self.watches[watched[0]]
+            self.files.pop(watched[0], None)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingBackend:
+    def __init__(self, root, scanner, interval=DEFAULT_POLL_INTERVAL):
+        """
+        Reports the source files created, modified or removed under a directory by scanning it periodically and
+        comparing the size and modification time of the files with the previous scan.
+        :param root: path to the directory to watch.
+        :param scanner: scanner.TreeScanner deciding which files are reported.
+        :param interval: seconds between two scans.
+        """
+        self.root = root
+        self.scanner = scanner
+        self.interval = interval
+        self.files = self.snapshot()
+        self.next_scan = time.monotonic() + interval
+
+    def snapshot(self) -> dict:
+        """
+        :return: (size, modification time) of every source file in the tree, by path.
+        """
+        files = {}
+        for entry in self.scanner.scan(self.root):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            files[entry.path] = (st.st_size, st.st_mtime_ns)
+        return files
+
+    def read(self, timeout) -> list:
+        """
+        Wait for the next scan, if it is due within timeout, and report the differences with the previous one.
+        :return: list of (CREATED, CHANGED or REMOVED, path) events.
+        """
+        wait = self.next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        files = self.snapshot()
+        self.next_scan = time.monotonic() + self.interval
+        events = [(CHANGED if path in self.files else CREATED, path) for (path, key) in files.items()
+                  if self.files.get(path) != key]
+        events.extend((REMOVED, path) for path in self.files if path not in files)
+        self.files = files
+        return events
+
+    def close(self):
+        pass
+
+
+class Watcher:
+    def __init__(self, generator, heading, recurse=True, ignore_files=(), settle=DEFAULT_SETTLE_TIME,
+                 backend=None, poll_interval=DEFAULT_POLL_INTERVAL, on_result=None):
+        """
+        :param generator: HeadingGenerator whose path is the directory to watch.
+        :param heading: heading inserted in the new files. Its description and remarks are not used.
+        :param recurse: whether to watch subdirectories as well.
+        :param ignore_files: paths to more .gitignore-style files applying to the whole tree.
+        :param settle: seconds a file has to go without being written to before it is signed.
+        :param backend: INOTIFY_BACKEND, POLLING_BACKEND, or None to use inotify where available.
+        :param poll_interval: seconds between two scans of the tree with the polling backend.
+        :param on_result: callable called with the FileResult of every file checked.
+        """
+        self.generator = generator
+        self.heading = treewalker.Heading(heading.author, heading.licence)
+        self.scanner = generator.get_scanner(recurse, ignore_files)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.on_result = on_result
+        # Real paths of the files known to have a heading, which are never opened again.
+        self.headed = set()
+        # Time at which each file with pending changes will have settled, by path.
+        self.pending = {}
+        self.backend = self.open_backend(backend)
+
+    def open_backend(self, backend):
+        if backend != POLLING_BACKEND and sys.platform.startswith('linux'):
+            try:
+                return InotifyBackend(self.generator.path, self.scanner)
+            except OSError as e:
+                if backend == INOTIFY_BACKEND:
+                    raise
+                if e.errno == errno.ENOSPC:
+                    self.report_out_of_watches()
+        elif backend == INOTIFY_BACKEND:
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        return PollingBackend(self.generator.path, self.scanner, self.poll_interval)
+
+    def report_out_of_watches(self):
+        print('{0}: out of inotify watches, polling instead; raise fs.inotify.max_user_watches to avoid it'.format(
+            self.generator.path), file=sys.stderr)
+
+    def run(self, stop=None):
+        """
+        Watch the directory until stop is set, or forever.
+        :param stop: threading.Event.
+        """
+        while stop is None or not stop.is_set():
+            self.poll(MAX_WAIT)
+
+    def poll(self, timeout):
+        """
+        Wait for changes for at most timeout seconds, then sign the files whose writes have settled.
+        """
+        if self.pending:
+            timeout = max(0.0, min(timeout, min(self.pending.values()) - time.monotonic()))
+        events = self.backend.read(timeout)
+        if getattr(self.backend, 'out_of_watches', False):
+            # A directory created in the tree needed a watch the system could not give.
+            self.report_out_of_watches()
+            self.backend.close()
+            self.backend = self.open_backend(POLLING_BACKEND)
+        now = time.monotonic()
+        for (kind, path) in events:
+            real_path = os.path.realpath(path)
+            if kind == REMOVED:
+                self.headed.discard(real_path)
+                self.pending.pop(real_path, None)
+            elif kind == CREATED and real_path not in self.headed or real_path in self.pending:
+                # Only new files are signed; writes to them push back the time they are signed at.
+                self.pending[real_path] = now + self.settle
+        self.sign_settled(now)
+
+    def sign_settled(self, now):
+        due = [path for (path, deadline) in self.pending.items() if deadline <= now]
+        if not due:
+            return
+        group = treewalker.CommitGroup(self.record)
+        for path in due:
+            del self.pending[path]
+            group.add(self.generator.comment_path(path, self.heading))
+        group.flush()
+
+    def record(self, result):
+        if result.status in (treewalker.HEADED, treewalker.ALREADY_HEADED):
+            self.headed.add(result.path)
+        elif isinstance(result.error, FileNotFoundError):
+            # Temporary files of editors and build tools are often gone before they settle.
+            return
+        if self.on_result:
+            self.on_result(result)
+
+    def close(self):
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()